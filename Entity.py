@@ -1,10 +1,10 @@
 from __future__ import annotations
 
-import copy
 import math
-from typing import Tuple, TypeVar, TYPE_CHECKING, Optional, Type, Union
+from typing import Any, Tuple, TypeVar, TYPE_CHECKING, Optional, Type, Union
 
 from render_order import RenderOrder
+from slotted import Slotted
 
 if TYPE_CHECKING:
     from components.ai import BaseAI
@@ -16,9 +16,11 @@ if TYPE_CHECKING:
 
 T = TypeVar("T", bound="Entity")
 
-class Entity:
+class Entity(Slotted):
     # Represents generically anything in the game
 
+    __slots__ = ("x", "y", "char", "color", "name", "blocks_movement", "render_order", "parent")
+
     parent: Union[GameMap, Inventory]
 
     def __init__(self, parent: Optional[GameMap] = None, x: int = 0, y: int = 0, char: str = "?", color: Tuple[int, int, int] = (255, 255, 255), name: str = "<Unnamed>", blocks_movement: bool = False, render_order: RenderOrder = RenderOrder.CORPSE,):
@@ -32,31 +34,51 @@ class Entity:
         if parent:
             # If parent isn't provided now then it will be set later
             self.parent = parent
-            parent.entities.add(self)
+            parent.add_entity(self)
 
     @property
     def gamemap(self) -> GameMap:
         return self.parent.gamemap
 
+    def clone(self: T) -> T:
+        """Return a new entity built from this one's constructor arguments, not on any map."""
+        return type(self)(
+            x=self.x,
+            y=self.y,
+            char=self.char,
+            color=self.color,
+            name=self.name,
+            blocks_movement=self.blocks_movement,
+            render_order=self.render_order,
+        )
+
     def spawn(self: T, gamemap: GameMap, x: int, y: int) -> T:
         # Spawn a copy of this instance at the given location
-        clone = copy.deepcopy(self)
+        clone = self.clone()
         clone.x = x
         clone.y = y
         clone.parent = gamemap
-        gamemap.entities.add(clone)
+        gamemap.add_entity(clone)
         return clone
     
     def place(self, x: int, y: int, gamemap: Optional[GameMap] = None) -> None:
         """Place this entity at a new location.  Handles moving across GameMaps."""
-        self.x = x
-        self.y = y
         if gamemap:
             if hasattr(self, "parent"):  # Possibly uninitialized.
                 if self.parent is self.gamemap:
-                    self.gamemap.entities.remove(self)
+                    self.gamemap.remove_entity(self)
+            if self in gamemap.entities:
+                # Already indexed at its old location (e.g. passed to the GameMap constructor).
+                gamemap.remove_entity(self)
+            self.x = x
+            self.y = y
             self.parent = gamemap
-            gamemap.entities.add(self)
+            gamemap.add_entity(self)
+        elif hasattr(self, "parent") and self.parent is self.gamemap:
+            self.gamemap.move_entity(self, x, y)
+        else:
+            self.x = x
+            self.y = y
 
     def distance(self, x: int, y: int) -> float:
         # Returns distance between the entity and the given coordinates.
@@ -64,10 +86,11 @@ class Entity:
 
     def move(self, dx: int, dy: int):
         # Moves the entity
-        self.x += dx
-        self.y += dy
+        self.gamemap.move_entity(self, self.x + dx, self.y + dy)
 
 class Actor(Entity):
+    __slots__ = ("ai_cls", "ai", "fighter", "inventory", "level")
+
     def __init__(self, *, x: int = 0, y: int = 0, char: str = "?", color: Tuple[int, int, int] = (255, 255, 255), name: str = "<Unnamed>", ai_cls: Type[BaseAI], fighter: Fighter, inventory: Inventory, level: Level,):
         super().__init__(
             x=x,
@@ -79,6 +102,7 @@ class Actor(Entity):
             render_order=RenderOrder.ACTOR,
         )
 
+        self.ai_cls = ai_cls
         self.ai: Optional[BaseAI] = ai_cls(self)
 
         self.fighter = fighter
@@ -90,13 +114,36 @@ class Actor(Entity):
         self.level = level
         self.level.parent = self
 
+    def __setstate__(self, state: Any) -> None:
+        super().__setstate__(state)
+        if not hasattr(self, "ai_cls"):  # Saved before actors remembered their AI class.
+            from components.ai import HostileEnemy
+
+            self.ai_cls = HostileEnemy
+
     @property
     def is_alive(self) -> bool:
         # Returns True if the actor can still perform actions
         return bool(self.ai)
+
+    def clone(self) -> Actor:
+        # Build a fresh actor with the AI it was created with, and copies of its components.
+        return Actor(
+            x=self.x,
+            y=self.y,
+            char=self.char,
+            color=self.color,
+            name=self.name,
+            ai_cls=self.ai_cls,
+            fighter=self.fighter.clone(),
+            inventory=self.inventory.clone(),
+            level=self.level.clone(),
+        )
     
 
 class Item(Entity):
+    __slots__ = ("consumable",)
+
     def __init__(
         self,
         *,
@@ -118,4 +165,14 @@ class Item(Entity):
         )
 
         self.consumable = consumable
-        self.consumable.parent = self
\ No newline at end of file
+        self.consumable.parent = self
+
+    def clone(self) -> Item:
+        return Item(
+            x=self.x,
+            y=self.y,
+            char=self.char,
+            color=self.color,
+            name=self.name,
+            consumable=self.consumable.clone(),
+        )
\ No newline at end of file
@@ -2,16 +2,19 @@ from __future__ import annotations
 
 from typing import TYPE_CHECKING, Tuple, Optional
 
-from Entity import Actor
+from Entity import Actor, Item
 import color
 import exceptions
+from slotted import Slotted
 
 if TYPE_CHECKING:
     from engine import Engine
-    from Entity import Entity, Actor, Item
+    from Entity import Entity
 
 
-class Action:
+class Action(Slotted):
+    __slots__ = ("entity",)
+
     def __init__(self, entity: Actor) -> None:
         super().__init__()
         self.entity = entity
@@ -27,6 +30,8 @@ class Action:
         raise NotImplementedError()
 
 class PickUpAction(Action):
+    __slots__ = ()
+
     # Pick up an item and add it to the inventory, if there's room for it
     def __init__(self, entity: Actor):
         super().__init__(entity)
@@ -36,12 +41,12 @@ class PickUpAction(Action):
         actor_location_y = self.entity.y
         inventory = self.entity.inventory
 
-        for item in self.engine.game_map.items:
-            if actor_location_x == item.x and actor_location_y == item.y:
+        for item in self.engine.game_map.get_entities_at(actor_location_x, actor_location_y):
+            if isinstance(item, Item):
                 if len(inventory.items) >= inventory.capacity:
                     raise exceptions.Impossible("Your inventory is full.")
                 
-                self.engine.game_map.entities.remove(item)
+                self.engine.game_map.remove_entity(item)
                 item.parent = self.entity.inventory
                 inventory.items.append(item)
 
@@ -52,6 +57,8 @@ class PickUpAction(Action):
 
 
 class ItemAction(Action):
+    __slots__ = ("item", "target_xy")
+
     def __init__(self, entity: Actor, item: Item, target_xy: Optional[Tuple[int, int]] = None) -> None:
         super().__init__(entity)
         self.item = item
@@ -69,25 +76,41 @@ class ItemAction(Action):
         self.item.consumable.activate(self)
     
 class DropItem(ItemAction):
+    __slots__ = ()
+
     def perform(self) -> None:
         self.entity.inventory.drop(self.item)
 
 class WaitAction(Action):
+    __slots__ = ()
+
     def perform(self) -> None:
         pass
 
 class TakeStairsAction(Action):
+    __slots__ = ()
+
     def perform(self) -> None:
         # Take the stairs, if there are any at the player's location
-        if (self.entity.x, self.entity.y) == self.engine.game_map.upstairs_location:
+        location = self.entity.x, self.entity.y
+        if location == self.engine.game_map.upstairs_location:
             self.engine.game_world.generate_floor()
             self.engine.message_log.add_message(
                 "You ascend the staircase.", color.ascend
             )
+        elif location == self.engine.game_map.downstairs_location:
+            self.engine.game_world.change_floor(self.engine.game_world.current_floor - 1)
+            self.engine.message_log.add_message(
+                "You descend the staircase.", color.descend
+            )
         else:
             raise exceptions.Impossible("There are no stairs here.")
+        if self.engine.autosaver:
+            self.engine.autosaver.request()
 
 class ActionWithDirection(Action):
+    __slots__ = ("dx", "dy")
+
     def __init__(self, entity: Actor, dx: int, dy: int):
         super().__init__(entity)
 
@@ -113,6 +136,8 @@ class ActionWithDirection(Action):
         raise NotImplementedError()
 
 class MeleeAttack(ActionWithDirection):
+     __slots__ = ()
+
      def perform(self) -> None:
         target = self.target_actor
         if not target:
@@ -138,13 +163,15 @@ class MeleeAttack(ActionWithDirection):
 
 
 class MovementAction(ActionWithDirection):
+    __slots__ = ()
+
     def perform(self) -> None:
         dest_x, dest_y = self.dest_xy
 
         if not self.engine.game_map.in_bounds(dest_x, dest_y):
             # Destination out of bounds
             raise exceptions.Impossible("The way is blocked.")
-        if not self.engine.game_map.tiles["walkable"][dest_x, dest_y]:
+        if not self.engine.game_map.is_walkable(dest_x, dest_y):
             # Destination not walkable (wall)
             raise exceptions.Impossible("The way is blocked.")
         if self.engine.game_map.get_blocking_entity_at(dest_x, dest_y):
@@ -154,6 +181,8 @@ class MovementAction(ActionWithDirection):
         self.entity.move(self.dx, self.dy)
 
 class BumpAction(ActionWithDirection):
+    __slots__ = ()
+
     def perform(self) -> None:
         if self.target_actor:
             return MeleeAttack(self.entity, self.dx, self.dy).perform()
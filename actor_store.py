@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+from typing import Dict, List, Optional, TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from Entity import Actor
+
+# Column name and dtype of every value mirrored from an actor.
+COLUMNS = {
+    "x": np.int32,
+    "y": np.int32,
+    "hp": np.int32,
+    "max_hp": np.int32,
+    "power": np.int32,
+    "defense": np.int32,
+    "xp_given": np.int32,
+    "alive": np.bool_,
+    "render_order": np.int8,
+    "dormant": np.bool_,  # Parked by the map, see GameMap.update_dormancy.
+}
+
+
+class ActorStore:
+    """Structure-of-arrays copy of the actors on a GameMap, one row per actor.
+
+    The Actor objects and their components stay authoritative: GameMap and Fighter write
+    every change through to the row, so whole populations can be queried with NumPy
+    (`store.x[store.living_rows()]`) instead of walking Python objects.
+    Rows of removed actors are reused.  Unused rows are never alive.
+    """
+
+    def __init__(self, capacity: int = 64):
+        self.actors: List[Optional[Actor]] = []  # The actor using each row.
+        self.rows: Dict[Actor, int] = {}
+        self._free_rows: List[int] = []
+        self.x = np.zeros(capacity, dtype=COLUMNS["x"])
+        self.y = np.zeros(capacity, dtype=COLUMNS["y"])
+        self.hp = np.zeros(capacity, dtype=COLUMNS["hp"])
+        self.max_hp = np.zeros(capacity, dtype=COLUMNS["max_hp"])
+        self.power = np.zeros(capacity, dtype=COLUMNS["power"])
+        self.defense = np.zeros(capacity, dtype=COLUMNS["defense"])
+        self.xp_given = np.zeros(capacity, dtype=COLUMNS["xp_given"])
+        self.alive = np.zeros(capacity, dtype=COLUMNS["alive"])
+        self.render_order = np.zeros(capacity, dtype=COLUMNS["render_order"])
+        self.dormant = np.zeros(capacity, dtype=COLUMNS["dormant"])
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @property
+    def size(self) -> int:
+        """Number of rows in use or free, every column is valid up to this length."""
+        return len(self.actors)
+
+    def _grow(self) -> None:
+        # Double the capacity of every column.
+        for name in COLUMNS:
+            column = getattr(self, name)
+            grown = np.zeros(len(column) * 2, dtype=column.dtype)
+            grown[: len(column)] = column
+            setattr(self, name, grown)
+
+    def add(self, actor: Actor) -> int:
+        """Give an actor a row and return it."""
+        if self._free_rows:
+            row = self._free_rows.pop()
+            self.actors[row] = actor
+        else:
+            row = len(self.actors)
+            if row == len(self.x):
+                self._grow()
+            self.actors.append(actor)
+        self.rows[actor] = row
+        actor.fighter.store = self
+        self.update(actor)
+        self.dormant[row] = False
+        return row
+
+    def remove(self, actor: Actor) -> None:
+        """Free the row of an actor which has left the map."""
+        row = self.rows.pop(actor)
+        self.actors[row] = None
+        self.alive[row] = False
+        self.dormant[row] = False
+        self._free_rows.append(row)
+        actor.fighter.store = None
+
+    def update(self, actor: Actor) -> None:
+        """Copy every column of an actor into its row."""
+        row = self.rows[actor]
+        fighter = actor.fighter
+        self.x[row] = actor.x
+        self.y[row] = actor.y
+        self.hp[row] = fighter.hp
+        self.max_hp[row] = fighter.max_hp
+        self.power[row] = fighter.power
+        self.defense[row] = fighter.defense
+        self.xp_given[row] = actor.level.xp_given
+        self.alive[row] = actor.is_alive
+        self.render_order[row] = actor.render_order.value
+
+    def update_stats(self, actor: Actor) -> None:
+        """Copy the Fighter stats of an actor into its row."""
+        row = self.rows[actor]
+        fighter = actor.fighter
+        self.hp[row] = fighter.hp
+        self.max_hp[row] = fighter.max_hp
+        self.power[row] = fighter.power
+        self.defense[row] = fighter.defense
+
+    def living_rows(self) -> np.ndarray:
+        """Return the rows of every living actor, in row order."""
+        return np.nonzero(self.alive[: self.size])[0]
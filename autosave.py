@@ -0,0 +1,149 @@
+"""Periodic saves written on a background thread."""
+from __future__ import annotations
+
+import threading
+import time
+import traceback
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
+
+import savefile
+
+if TYPE_CHECKING:
+    from engine import Engine
+
+
+class Autosaver:
+    """Saves the game every `interval` turns, and at the end of a turn where `request` was called.
+
+    The main thread only takes a snapshot of the game (see `savefile.snapshot`).  Compressing
+    and writing it happens on a background thread, and the finished file is renamed into
+    place.  If a save is still waiting to be written when the next one is taken, the older
+    one is skipped and counted in `coalesced`.  Saves which fail, whether taking the snapshot
+    or writing it, are printed to stderr and counted in `failed`.
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        interval: int = 50,
+        codec: str = savefile.DEFAULT_CODEC,
+        level: int = savefile.DEFAULT_LEVEL,
+    ):
+        self.filename = filename
+        self.interval = interval
+        self.codec = codec
+        self.level = level
+        self.turns_since_save = 0
+        self._requested = False
+
+        # Stats.  Latency is from taking the snapshot to the file being in place.
+        self.saves_started = 0
+        self.saves_written = 0
+        self.coalesced = 0
+        self.failed = 0
+        self.snapshot_seconds = 0.0  # Total time the main thread spent taking snapshots.
+        self.last_latency = 0.0
+        self.max_latency = 0.0
+        self.total_latency = 0.0
+
+        # The snapshot waiting to be written, with the time it was taken.
+        self._pending: Optional[Tuple[float, List[Tuple[str, savefile.Payload]]]] = None
+        self._writing = False
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="autosave", daemon=True)
+        self._thread.start()
+
+    def request(self) -> None:
+        """Save at the end of the current turn, for example after changing floors."""
+        self._requested = True
+
+    def turn_finished(self, engine: Engine) -> None:
+        """Called after every turn, saves if one is due."""
+        if not engine.player.is_alive:
+            return  # A finished game is never saved.
+        self.turns_since_save += 1
+        if self._requested or self.turns_since_save >= self.interval:
+            self.save(engine)
+
+    def save(self, engine: Engine) -> None:
+        """Take a snapshot of the game now and write it in the background."""
+        start = time.perf_counter()
+        # Wait for the next interval or request before trying again, even if this one fails.
+        self.turns_since_save = 0
+        self._requested = False
+        try:
+            sections = savefile.snapshot(engine, detached=True)
+        except Exception:
+            traceback.print_exc()  # Print to stderr, the game carries on.
+            with self._condition:
+                self.failed += 1
+            return
+        self.snapshot_seconds += time.perf_counter() - start
+
+        with self._condition:
+            if self._closed:
+                return
+            if self._pending is not None:
+                self.coalesced += 1
+            self._pending = start, sections
+            self.saves_started += 1
+            self._condition.notify_all()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while self._pending is None and not self._closed:
+                    self._condition.wait()
+                if self._pending is None:
+                    return  # Closed, and nothing left to write.
+                started, sections = self._pending
+                self._pending = None
+                self._writing = True
+
+            try:
+                savefile.write_snapshot(sections, self.filename, self.codec, self.level)
+            except Exception:
+                traceback.print_exc()  # Print to stderr, the game carries on.
+                failed = True
+            else:
+                failed = False
+            latency = time.perf_counter() - started
+
+            with self._condition:
+                if failed:
+                    self.failed += 1
+                else:
+                    self.saves_written += 1
+                    self.last_latency = latency
+                    self.max_latency = max(self.max_latency, latency)
+                    self.total_latency += latency
+                self._writing = False
+                self._condition.notify_all()
+
+    def flush(self) -> None:
+        """Wait until every save taken so far is written."""
+        with self._condition:
+            while self._pending is not None or self._writing:
+                self._condition.wait()
+
+    def close(self) -> None:
+        """Write any pending save and stop the background thread."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+
+    @property
+    def stats(self) -> Dict[str, float]:
+        written = self.saves_written
+        return {
+            "started": self.saves_started,
+            "written": written,
+            "coalesced": self.coalesced,
+            "failed": self.failed,
+            "mean_snapshot_ms": self.snapshot_seconds / max(1, self.saves_started) * 1000,
+            "last_latency_ms": self.last_latency * 1000,
+            "mean_latency_ms": self.total_latency / max(1, written) * 1000,
+            "max_latency_ms": self.max_latency * 1000,
+        }
@@ -0,0 +1,187 @@
+"""Micro-benchmarks for the game's hot paths.
+
+Usage: python benchmark.py render|spawn|save|dormant|floors [--frames 1000] [--seed 1]
+"""
+from __future__ import annotations
+
+import argparse
+import copy
+import itertools
+import lzma
+import os
+import pickle
+import tempfile
+import time
+from typing import Callable, Dict
+
+import numpy as np
+import tcod
+
+from actions import WaitAction
+from engine import Engine
+import entity_factories
+from game_map import GameMap
+import savefile
+import setup_game
+import tile_types
+
+
+def timed(label: str, count: int, function: Callable[[], None]) -> float:
+    """Run `function` `count` times and print the time taken per call."""
+    start = time.perf_counter()
+    for _ in range(count):
+        function()
+    seconds = time.perf_counter() - start
+    print(f"{label:<40} {seconds / count * 1e6:10.1f} us/call {count / seconds:12.0f} calls/s")
+    return seconds
+
+
+def full_redraw(game_map: GameMap, console: tcod.Console) -> None:
+    # The renderer as it was before dirty tile tracking, kept here as the baseline.
+    console.tiles_rgb[0 : game_map.width, 0 : game_map.height] = np.select(
+        condlist=[game_map.visible, game_map.explored],
+        choicelist=[game_map.tiles["light"], game_map.tiles["dark"]],
+        default=tile_types.SHROUD,
+    )
+    for entity in sorted(game_map.entities, key=lambda x: x.render_order.value):
+        if game_map.visible[entity.x, entity.y]:
+            console.print(x=entity.x, y=entity.y, string=entity.char, fg=entity.color)
+
+
+def bench_render(args: argparse.Namespace) -> None:
+    engine = setup_game.new_game(seed=args.seed)
+    console = tcod.Console(80, 50, order="F")
+
+    def take_turn(engine: Engine) -> None:
+        WaitAction(engine.player).perform()
+        engine.handle_enemy_turns()
+        engine.update_fov()
+
+    def idle_full() -> None:
+        console.clear()
+        full_redraw(engine.game_map, console)
+
+    def idle_incremental() -> None:
+        console.clear()
+        engine.game_map.render(console)
+
+    def turn_full() -> None:
+        take_turn(engine)
+        idle_full()
+
+    def turn_incremental() -> None:
+        take_turn(engine)
+        idle_incremental()
+
+    print(f"{len(engine.game_map.entities)} entities on a {engine.game_map.width}x{engine.game_map.height} map")
+    timed("idle frame, full redraw", args.frames, idle_full)
+    timed("idle frame, dirty tiles only", args.frames, idle_incremental)
+    timed("turn + frame, full redraw", args.frames, turn_full)
+    timed("turn + frame, dirty tiles only", args.frames, turn_incremental)
+
+
+def bench_spawn(args: argparse.Namespace) -> None:
+    engine = setup_game.new_game(seed=args.seed)
+    game_map = GameMap(engine, 80, 43)
+    prototypes = {
+        "bot": entity_factories.bot,
+        "bandage": entity_factories.bandage,
+        "player": entity_factories.player,
+    }
+    for name, prototype in prototypes.items():
+        timed(f"{name}: copy.deepcopy", args.frames, lambda: copy.deepcopy(prototype))
+        timed(f"{name}: clone", args.frames, prototype.clone)
+    timed("bot: spawn onto a map", args.frames, lambda: entity_factories.bot.spawn(game_map, 1, 1))
+
+
+def bench_save(args: argparse.Namespace) -> None:
+    engine = setup_game.new_game(seed=args.seed)
+    count = max(1, args.frames // 100)  # Saves are much slower than frames.
+
+    def pickle_save(filename: str) -> None:
+        # The save format used before savefile.py.
+        with open(filename, "wb") as f:
+            f.write(lzma.compress(pickle.dumps(engine)))
+
+    def pickle_load(filename: str) -> None:
+        with open(filename, "rb") as f:
+            pickle.loads(lzma.decompress(f.read()))
+
+    methods = {"pickle + lzma": (pickle_save, pickle_load)}
+    for codec, level in [("none", 0), ("zlib", 1), ("zlib", 6), ("bz2", 9), ("lzma", 6)]:
+        methods[f"{codec} {level}"] = (
+            lambda filename, codec=codec, level=level: savefile.save(engine, filename, codec, level),
+            savefile.load,
+        )
+
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "benchmark.sav")
+        for label, (save, load) in methods.items():
+            timed(f"{label}: save", count, lambda: save(filename))
+            timed(f"{label}: load", count, lambda: load(filename))
+            print(f"{label + ': size':<40} {os.path.getsize(filename):10d} bytes")
+
+
+def bench_dormant(args: argparse.Namespace) -> None:
+    # Enemy turns on a large open floor, with and without parking the enemies far from the
+    # player, for growing populations.
+    size = 400
+    for population in (100, 1000, 5000):
+        engine = setup_game.new_game(seed=args.seed)
+        game_map = GameMap(engine, size, size)
+        game_map.tiles[1:-1, 1:-1] = tile_types.floor
+        game_map.mark_tiles_changed()
+        engine.game_map = game_map
+        engine.player.place(size // 2, size // 2, game_map)
+        rng = np.random.default_rng(args.seed)
+        for x, y in rng.integers(1, size - 1, size=(population, 2)).tolist():
+            if not game_map.get_entities_at(x, y):
+                entity_factories.bot.spawn(game_map, x, y)
+        engine.update_fov()
+
+        total = len(game_map.scheduler) + game_map.dormant_count
+        count = max(1, args.frames // 10)
+        for radius in (None, 40):
+            engine.activity_radius = radius
+            label = f"{total} enemies, " + ("all awake" if radius is None else f"radius {radius}")
+            timed(label, count, engine.handle_enemy_turns)
+            print(f"{'':<40} {len(game_map.scheduler):10d} awake {game_map.dormant_count:10d} dormant")
+
+
+def bench_floors(args: argparse.Namespace) -> None:
+    # Walking down and up the stairs with fewer floors cached than visited, so floors are
+    # written to disk when evicted and loaded back when revisited.
+    for cached in (2, 5):
+        engine = setup_game.new_game(seed=args.seed)
+        world = engine.game_world
+        world.max_cached_floors = cached
+        for floor in range(2, 6):
+            world.change_floor(floor)
+        route = itertools.cycle([4, 3, 2, 1, 2, 3, 4, 5])
+        count = max(1, args.frames // 10)
+        timed(f"change floor, {cached} floors cached", count, lambda: world.change_floor(next(route)))
+        stats = world.cache_stats
+        print(f"{'':<40} {stats['hits']:10d} hits {stats['misses']:10d} misses {stats['evictions']:10d} evictions")
+        print(f"{'':<40} {stats['nbytes']:10d} bytes in memory")
+
+
+BENCHMARKS: Dict[str, Callable[[argparse.Namespace], None]] = {
+    "render": bench_render,
+    "spawn": bench_spawn,
+    "save": bench_save,
+    "dormant": bench_dormant,
+    "floors": bench_floors,
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run micro-benchmarks.")
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS))
+    parser.add_argument("--frames", type=int, default=1000, help="Iterations per measurement.")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    BENCHMARKS[args.benchmark](args)
+
+
+if __name__ == "__main__":
+    main()
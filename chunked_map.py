@@ -0,0 +1,394 @@
+"""Maps far larger than the screen, stored as square chunks of tiles.
+
+Chunks are generated the first time the player comes near them, from a generator seeded by
+the map seed and the chunk position, so the same map always has the same chunks.  Chunks
+far from the player are evicted: their tiles and entities are compressed and appended to a
+temporary spill file, and read back when the player comes back.  Memory use depends on the
+loaded chunks only, the spill file grows by a few kB for every chunk evicted.  Only the area
+around the player is ever turned into dense arrays, for FOV, pathfinding and rendering.
+
+Save files store every chunk in its packed form, see savefile.py.
+"""
+from __future__ import annotations
+
+import functools
+import json
+from collections import OrderedDict
+import tempfile
+import threading
+import zlib
+from typing import BinaryIO, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, TYPE_CHECKING
+
+import numpy as np
+
+from game_map import GameMap
+import profiler
+import tile_types
+
+if TYPE_CHECKING:
+    from engine import Engine
+    from Entity import Entity
+
+CHUNK_SIZE = 32
+# Chunks within this many chunks of the player's chunk (on either axis) are kept loaded.
+LOAD_RADIUS = 2
+# Loaded chunks further away than this are evicted.  Larger than LOAD_RADIUS so that walking
+# back and forth over a chunk border doesn't evict and load the same chunks every turn.
+EVICT_RADIUS = 3
+
+
+# A chunk as stored: its compressed tiles, explored flags and entity records.
+Packed = Tuple[bytes, bytes, bytes]
+# A chunk being saved: its position, the sizes of its packed data and a function to read it.
+PackedChunk = Tuple[Tuple[int, int], Tuple[int, int, int], Callable[[], Packed]]
+
+
+class Chunk:
+    __slots__ = ("tiles", "explored")
+
+    def __init__(self, tiles: np.ndarray, explored: np.ndarray):
+        self.tiles = tiles
+        self.explored = explored
+
+
+class ChunkSpill:
+    """Packed chunks in a temporary file, by chunk position.
+
+    The file is only appended to, so a chunk's bytes never change once written.  Reads
+    and writes hold a lock, so a save being written on another thread can read chunks
+    while the game goes on.
+    """
+
+    def __init__(self) -> None:
+        self._file: Optional[BinaryIO] = None
+        self._lock = threading.Lock()
+        self._end = 0
+        # Offset and the three sizes of each chunk's packed data.
+        self._index: Dict[Tuple[int, int], Tuple[int, int, int, int]] = {}
+
+    def __getstate__(self) -> dict:
+        return {"chunks": {position: self._read(entry) for position, entry in self._index.items()}}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__()  # type: ignore[misc]
+        for position, packed in state["chunks"].items():
+            self.put(position, packed)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, position: Tuple[int, int]) -> bool:
+        return position in self._index
+
+    @property
+    def file_size(self) -> int:
+        return self._end
+
+    def put(self, position: Tuple[int, int], packed: Packed) -> None:
+        with self._lock:
+            if self._file is None:
+                self._file = tempfile.TemporaryFile(prefix="tommy-chunks-")
+            self._file.seek(self._end)
+            for data in packed:
+                self._file.write(data)
+            self._index[position] = (self._end, *(len(data) for data in packed))
+            self._end += sum(len(data) for data in packed)
+
+    def pop(self, position: Tuple[int, int]) -> Optional[Packed]:
+        entry = self._index.pop(position, None)
+        return None if entry is None else self._read(entry)
+
+    def _read(self, entry: Tuple[int, int, int, int]) -> Packed:
+        offset, tiles_size, explored_size, records_size = entry
+        with self._lock:
+            assert self._file is not None
+            self._file.seek(offset)
+            return (
+                self._file.read(tiles_size),
+                self._file.read(explored_size),
+                self._file.read(records_size),
+            )
+
+    def items(self) -> List[PackedChunk]:
+        """Return the position and sizes of every chunk, with a function which reads its data.
+
+        The functions stay valid after the spill changes, so they can be used by a save
+        written in the background.
+        """
+        return [
+            (position, (entry[1], entry[2], entry[3]), functools.partial(self._read, entry))
+            for position, entry in self._index.items()
+        ]
+
+
+class ChunkedGameMap(GameMap):
+    """A GameMap which keeps only the chunks near the player in memory.
+
+    Tiles of chunks which aren't loaded count as walls.  `tiles`, `visible` and `explored`
+    don't exist on this map, use `get_tiles`, `is_walkable` and `is_visible` instead.
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        width: int,
+        height: int,
+        seed: Sequence[int],
+        entities: Iterable[Entity] = (),
+        *,
+        max_monsters_per_chunk: int = 0,
+        max_items_per_chunk: int = 0,
+        wall_density: float = 0.08,
+    ):
+        if width % CHUNK_SIZE or height % CHUNK_SIZE:
+            raise ValueError(f"Map size must be a multiple of {CHUNK_SIZE}, got {width}x{height}.")
+        self.seed = tuple(seed)
+        self.max_monsters_per_chunk = max_monsters_per_chunk
+        self.max_items_per_chunk = max_items_per_chunk
+        self.wall_density = wall_density
+        # Loaded chunks by chunk position, least recently used first.
+        self._chunks: OrderedDict[Tuple[int, int], Chunk] = OrderedDict()
+        # Evicted chunks, packed.
+        self._evicted = ChunkSpill()
+        self.chunks_generated = 0
+        self.chunks_loaded = 0
+        self.chunks_evicted = 0
+        super().__init__(engine, width, height, entities)
+
+    def _init_tiles(
+        self, tiles: Optional[np.ndarray], visible: Optional[np.ndarray], explored: Optional[np.ndarray]
+    ) -> None:
+        # Only the visible tiles around the player are stored densely.
+        self._visible_window = self.clip_window(0, 0, 0, 0)
+        self._visible = np.zeros((0, 0), dtype=bool, order="F")
+
+    @property
+    def is_large(self) -> bool:
+        return True  # Whatever its size, only the chunks around the player are in memory.
+
+    def chunk_rng(self, cx: int, cy: int) -> np.random.Generator:
+        return np.random.default_rng([*self.seed, cx, cy])
+
+    def set_focus(self, x: int, y: int) -> None:
+        """Load the chunks around (x, y) and evict the ones far from it."""
+        focus_cx, focus_cy = x // CHUNK_SIZE, y // CHUNK_SIZE
+        for position in list(self._chunks):
+            cx, cy = position
+            if max(abs(cx - focus_cx), abs(cy - focus_cy)) > EVICT_RADIUS:
+                self._evict_chunk(position)
+        for cy in range(focus_cy - LOAD_RADIUS, focus_cy + LOAD_RADIUS + 1):
+            for cx in range(focus_cx - LOAD_RADIUS, focus_cx + LOAD_RADIUS + 1):
+                if 0 <= cx * CHUNK_SIZE < self.width and 0 <= cy * CHUNK_SIZE < self.height:
+                    self._load_chunk((cx, cy))
+
+    def _load_chunk(self, position: Tuple[int, int]) -> None:
+        if position in self._chunks:
+            self._chunks.move_to_end(position)
+            return
+        shape = CHUNK_SIZE, CHUNK_SIZE
+        packed = self._evicted.pop(position)
+        if packed is None:
+            chunk = Chunk(
+                np.full(shape, fill_value=tile_types.wall, order="F"),
+                np.zeros(shape, dtype=bool, order="F"),
+            )
+            self._chunks[position] = chunk
+            self.generate_chunk(*position, chunk)
+            self.chunks_generated += 1
+            self.mark_tiles_changed()
+            return
+
+        import savefile
+
+        tiles, explored, records = (zlib.decompress(data) for data in packed)
+        chunk = Chunk(
+            np.frombuffer(tiles, dtype=tile_types.tile_dt).reshape(shape, order="F").copy(order="F"),
+            np.frombuffer(explored, dtype=bool).reshape(shape, order="F").copy(order="F"),
+        )
+        self._chunks[position] = chunk
+        for record in json.loads(records):
+            entity = savefile.load_entity(record)
+            entity.place(entity.x, entity.y, self)
+        self.chunks_loaded += 1
+        self.mark_tiles_changed()
+
+    def _evict_chunk(self, position: Tuple[int, int]) -> None:
+        chunk = self._chunks.pop(position)
+        entities, packed = self._pack_chunk(position, chunk)
+        for entity in entities:
+            self.remove_entity(entity)
+        self._evicted.put(position, packed)
+        self.chunks_evicted += 1
+        self.mark_tiles_changed()
+
+    def _pack_chunk(self, position: Tuple[int, int], chunk: Chunk) -> Tuple[List[Entity], Packed]:
+        # Return the entities on a loaded chunk and the chunk packed with them.
+        import savefile
+
+        xs, ys = self._chunk_window(*position)
+        player = self.engine.player
+        # The player is never packed, even when the map isn't the one being played.
+        profiler.count("entity_scan")
+        entities = [
+            entity
+            for entity in self.entities
+            if xs.start <= entity.x < xs.stop and ys.start <= entity.y < ys.stop and entity is not player
+        ]
+        records = [savefile.entity_record(entity) for entity in entities]
+        packed = (
+            zlib.compress(chunk.tiles.tobytes(order="F")),
+            zlib.compress(chunk.explored.tobytes(order="F")),
+            zlib.compress(json.dumps(records, separators=(",", ":")).encode("utf-8")),
+        )
+        return entities, packed
+
+    def packed_chunks(self) -> Tuple[List[Entity], List[PackedChunk]]:
+        """Return the entities which aren't on a chunk, and every chunk packed, for saving.
+
+        Loaded chunks are packed now, with their entities.  Evicted ones are only read when
+        their function is called, which can be after the game has gone on.
+        """
+        packed_entities: Dict[Entity, None] = {}
+        chunks: List[PackedChunk] = []
+        for position, chunk in self._chunks.items():
+            entities, packed = self._pack_chunk(position, chunk)
+            packed_entities.update(dict.fromkeys(entities))
+            sizes = len(packed[0]), len(packed[1]), len(packed[2])
+            chunks.append((position, sizes, functools.partial(tuple, packed)))
+        chunks += self._evicted.items()
+        return [entity for entity in self.entities if entity not in packed_entities], chunks
+
+    def add_packed_chunk(self, position: Tuple[int, int], packed: Packed) -> None:
+        """Add a chunk packed by `packed_chunks` to a map loaded from a save, as evicted."""
+        self._evicted.put(position, packed)
+
+    def generate_chunk(self, cx: int, cy: int, chunk: Chunk) -> None:
+        """Fill a new chunk with open floor, scattered walls and entities.
+
+        Override to generate other terrain.  The chunk is already loaded, so entities can be
+        spawned on it.
+        """
+        from procgen import RectangularRoom, place_entities
+
+        rng = self.chunk_rng(cx, cy)
+        chunk.tiles[:] = tile_types.floor
+        chunk.tiles[rng.random((CHUNK_SIZE, CHUNK_SIZE)) < self.wall_density] = tile_types.wall
+        self._stamp_stairs(cx, cy, chunk)
+        room = RectangularRoom(cx * CHUNK_SIZE, cy * CHUNK_SIZE, CHUNK_SIZE - 1, CHUNK_SIZE - 1)
+        place_entities(room, self, self.max_monsters_per_chunk, self.max_items_per_chunk, rng)
+
+    def _stamp_stairs(self, cx: int, cy: int, chunk: Chunk) -> None:
+        # The arrival point and stairs of the map, when they are in this chunk.
+        stamps = [(self.entry_location, tile_types.floor), (self.upstairs_location, tile_types.up_stairs)]
+        if self.downstairs_location is not None:
+            stamps.append((self.downstairs_location, tile_types.down_stairs))
+        for (x, y), tile in stamps:
+            if (x // CHUNK_SIZE, y // CHUNK_SIZE) == (cx, cy):
+                chunk.tiles[x % CHUNK_SIZE, y % CHUNK_SIZE] = tile
+
+    def _chunk_window(self, cx: int, cy: int) -> Tuple[slice, slice]:
+        return self.clip_window(
+            cx * CHUNK_SIZE, cy * CHUNK_SIZE, (cx + 1) * CHUNK_SIZE, (cy + 1) * CHUNK_SIZE
+        )
+
+    def _gather(self, window: Tuple[slice, slice], attribute: str, fill_value: object) -> np.ndarray:
+        # Copy one array of every loaded chunk overlapping `window` into a dense array.
+        xs, ys = window
+        result = np.full((xs.stop - xs.start, ys.stop - ys.start), fill_value=fill_value, order="F")
+        for (cx, cy), chunk_xs, chunk_ys, part_xs, part_ys in self._overlapping_chunks(window):
+            chunk = self._chunks.get((cx, cy))
+            if chunk is not None:
+                result[part_xs, part_ys] = getattr(chunk, attribute)[chunk_xs, chunk_ys]
+        return result
+
+    def _overlapping_chunks(
+        self, window: Tuple[slice, slice]
+    ) -> Iterable[Tuple[Tuple[int, int], slice, slice, slice, slice]]:
+        # Yield each chunk position overlapping `window`, with the overlap as slices of the
+        # chunk and as slices of the window.
+        xs, ys = window
+        if xs.stop <= xs.start or ys.stop <= ys.start:
+            return
+        for cy in range(ys.start // CHUNK_SIZE, (ys.stop - 1) // CHUNK_SIZE + 1):
+            y1 = max(ys.start, cy * CHUNK_SIZE)
+            y2 = min(ys.stop, (cy + 1) * CHUNK_SIZE)
+            for cx in range(xs.start // CHUNK_SIZE, (xs.stop - 1) // CHUNK_SIZE + 1):
+                x1 = max(xs.start, cx * CHUNK_SIZE)
+                x2 = min(xs.stop, (cx + 1) * CHUNK_SIZE)
+                yield (
+                    (cx, cy),
+                    slice(x1 - cx * CHUNK_SIZE, x2 - cx * CHUNK_SIZE),
+                    slice(y1 - cy * CHUNK_SIZE, y2 - cy * CHUNK_SIZE),
+                    slice(x1 - xs.start, x2 - xs.start),
+                    slice(y1 - ys.start, y2 - ys.start),
+                )
+
+    def is_walkable(self, x: int, y: int) -> bool:
+        chunk = self._chunks.get((x // CHUNK_SIZE, y // CHUNK_SIZE))
+        return chunk is not None and bool(chunk.tiles["walkable"][x % CHUNK_SIZE, y % CHUNK_SIZE])
+
+    def is_visible(self, x: int, y: int) -> bool:
+        xs, ys = self._visible_window
+        if not (xs.start <= x < xs.stop and ys.start <= y < ys.stop):
+            return False
+        return bool(self._visible[x - xs.start, y - ys.start])
+
+    def visible_at(self, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        window_xs, window_ys = self._visible_window
+        xs = xs - window_xs.start
+        ys = ys - window_ys.start
+        inside = (0 <= xs) & (xs < self._visible.shape[0]) & (0 <= ys) & (ys < self._visible.shape[1])
+        result = np.zeros(len(xs), dtype=bool)
+        result[inside] = self._visible[xs[inside], ys[inside]]
+        return result
+
+    def get_tiles(self, window: Tuple[slice, slice]) -> np.ndarray:
+        return self._gather(window, "tiles", tile_types.wall)
+
+    def get_visible(self, window: Tuple[slice, slice]) -> np.ndarray:
+        """Return which tiles of a window the player can see."""
+        xs, ys = window
+        visible_xs, visible_ys = self._visible_window
+        result = np.zeros((xs.stop - xs.start, ys.stop - ys.start), dtype=bool, order="F")
+        x1, x2 = max(xs.start, visible_xs.start), min(xs.stop, visible_xs.stop)
+        y1, y2 = max(ys.start, visible_ys.start), min(ys.stop, visible_ys.stop)
+        if x1 < x2 and y1 < y2:
+            result[x1 - xs.start : x2 - xs.start, y1 - ys.start : y2 - ys.start] = self._visible[
+                x1 - visible_xs.start : x2 - visible_xs.start, y1 - visible_ys.start : y2 - visible_ys.start
+            ]
+        return result
+
+    def get_explored(self, window: Tuple[slice, slice]) -> np.ndarray:
+        return self._gather(window, "explored", False)
+
+    def update_visible(self, visible: np.ndarray, window: Optional[Tuple[slice, slice]] = None) -> None:
+        if window is None:
+            raise ValueError("A chunked map needs the window the visible tiles cover.")
+        self._visible = np.array(visible, dtype=bool, order="F")
+        self._visible_window = window
+        for position, chunk_xs, chunk_ys, part_xs, part_ys in self._overlapping_chunks(window):
+            chunk = self._chunks.get(position)
+            if chunk is not None:
+                chunk.explored[chunk_xs, chunk_ys] |= self._visible[part_xs, part_ys]
+
+    def get_path_cost(self, window: Optional[Tuple[slice, slice]] = None) -> np.ndarray:
+        """Return the pathfinding costs of a window of the map, built on every call."""
+        if window is None:
+            raise ValueError("A chunked map only builds path costs for a window.")
+        return self._build_path_cost(window)
+
+    @property
+    def nbytes(self) -> int:
+        loaded = sum(chunk.tiles.nbytes + chunk.explored.nbytes for chunk in self._chunks.values())
+        return loaded + self._visible.nbytes
+
+    @property
+    def chunk_stats(self) -> Dict[str, int]:
+        return {
+            "loaded": len(self._chunks),
+            "evicted": len(self._evicted),
+            "spill_bytes": self._evicted.file_size,
+            "generated": self.chunks_generated,
+            "reloads": self.chunks_loaded,
+            "evictions": self.chunks_evicted,
+        }
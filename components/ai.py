@@ -1,9 +1,7 @@
 from __future__ import annotations
 
-import random
 from typing import List, Tuple, TYPE_CHECKING, Optional
 
-import numpy as np
 import tcod
 
 from Entity import Actor
@@ -12,55 +10,73 @@ from actions import Action, MeleeAttack, MovementAction, WaitAction, BumpAction
 if TYPE_CHECKING:
     from Entity import Actor
 
+DIRECTIONS = [
+    (-1, -1),  # Northwest
+    (0, -1),  # North
+    (1, -1),  # Northeast
+    (-1, 0),  # West
+    (1, 0),  # East
+    (-1, 1),  # Southwest
+    (0, 1),  # South
+    (1, 1),  # Southeast
+]
+
 class BaseAI(Action):
+    __slots__ = ()
+
     def perform(self) -> None:
         raise NotImplementedError()
-    
-    def get_path_to(self, dest_x: int, dest_y: int) -> List[Tuple[int, int]]:
-        """Compute and return a path to the target position.
 
-        If there is no valid path then returns an empty list.
-        """
-        # Copy the walkable array.
-        cost = np.array(self.entity.gamemap.tiles["walkable"], dtype=np.int8)
-
-        for entity in self.entity.gamemap.entities:
-            # Check that an enitiy blocks movement and the cost isn't zero (blocking.)
-            if entity.blocks_movement and cost[entity.x, entity.y]:
-                # Add to the cost of a blocked position.
-                # A lower number means more enemies will crowd behind each other in
-                # hallways.  A higher number means enemies will take longer paths in
-                # order to surround the player.
-                cost[entity.x, entity.y] += 10
+    def is_idle(self) -> bool:
+        """Return True if this AI would only wait while the player can't see its actor.
 
-        # Create a graph from the cost array and pass that graph to a new pathfinder.
-        graph = tcod.path.SimpleGraph(cost=cost, cardinal=2, diagonal=3)
-        pathfinder = tcod.path.Pathfinder(graph)
+        Idle actors out of sight are parked by the map until something wakes them.
+        """
+        return False
 
-        pathfinder.add_root((self.entity.x, self.entity.y))  # Start position.
+    def has_timer(self) -> bool:
+        """Return True if this AI counts down its turns, so it is never parked for being far away."""
+        return False
 
-        # Compute the path to the destination and remove the starting point.
-        path: List[List[int]] = pathfinder.path_to((dest_x, dest_y))[1:].tolist()
+    def get_path_from(
+        self, pathfinder: tcod.path.Pathfinder, origin: Tuple[int, int] = (0, 0)
+    ) -> List[Tuple[int, int]]:
+        """Return a path toward the root of an already resolved pathfinder.
 
-        # Convert from List[List[int]] to List[Tuple[int, int]].
-        return [(index[0], index[1]) for index in path]
+        This lets many actors share one pathfinder rooted at their common destination.
+        `origin` is the map position of the pathfinder's (0, 0) when it only covers part of the
+        map.  Actors outside of that part get an empty path.
+        """
+        x = self.entity.x - origin[0]
+        y = self.entity.y - origin[1]
+        width, height = pathfinder.distance.shape
+        if not (0 <= x < width and 0 <= y < height):
+            return []
+        path: List[List[int]] = pathfinder.path_from((x, y))[1:].tolist()
+        return [(index[0] + origin[0], index[1] + origin[1]) for index in path]
 
 class HostileEnemy(BaseAI):
+    __slots__ = ("path",)
+
     def __init__(self, entity: Actor):
         super().__init__(entity)
         self.path: List[Tuple[int, int]] = []
 
+    def is_idle(self) -> bool:
+        return not self.path
+
     def perform(self) -> None:
         target = self.engine.player
         dx = target.x - self.entity.x
         dy = target.y - self.entity.y
         distance = max(abs(dx), abs(dy))  # Chebyshev distance.
 
-        if self.engine.game_map.visible[self.entity.x, self.entity.y]:
+        if self.engine.game_map.is_visible(self.entity.x, self.entity.y):
             if distance <= 1:
                 return MeleeAttack(self.entity, dx, dy).perform()
 
-            self.path = self.get_path_to(target.x, target.y)
+            pathfinder = self.engine.get_player_pathfinder()
+            self.path = self.get_path_from(pathfinder, self.engine.player_path_origin)
 
         if self.path:
             dest_x, dest_y = self.path.pop(0)
@@ -73,12 +89,17 @@ class HostileEnemy(BaseAI):
 class ConfusedEnemy(BaseAI):
     #A confused enemy will stumble around aimlessly for a given number of turns, then revert back to its previous AI.
     #If an actor occupies a tile it is randomly moving into, it will attack.
+
+    __slots__ = ("previous_ai", "turns_remaining")
     
     def __init__(self, entity: Actor, previous_ai: Optional[BaseAI], turns_remaining: int) -> None:
         super().__init__(entity)
 
         self.previous_ai = previous_ai
         self.turns_remaining = turns_remaining
+
+    def has_timer(self) -> bool:
+        return True
     
     def perform(self) -> None:
         # Revert AI back to its original state when the effect is done
@@ -89,18 +110,7 @@ class ConfusedEnemy(BaseAI):
             self.entity.ai = self.previous_ai
         else:
             # Pick a random direction
-            direction_x, direction_y = random.choice(
-                [
-                    (-1, -1),  # Northwest
-                    (0, -1),  # North
-                    (1, -1),  # Northeast
-                    (-1, 0),  # West
-                    (1, 0),  # East
-                    (-1, 1),  # Southwest
-                    (0, 1),  # South
-                    (1, 1),  # Southeast
-                ]
-            )
+            direction_x, direction_y = DIRECTIONS[self.engine.game_world.rng.integers(len(DIRECTIONS))]
 
             self.turns_remaining -= 1
 
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import copy
 from typing import Optional, TYPE_CHECKING
 
 import actions
@@ -14,6 +15,8 @@ if TYPE_CHECKING:
     from Entity import Actor, Item
 
 class Consumable(BaseComponent):
+    __slots__ = ()
+
     parent: Item
 
     def get_action(self, consumer: Actor) -> Optional[ActionOrHandler]:
@@ -23,6 +26,11 @@ class Consumable(BaseComponent):
     def activate(self, action: actions.ItemAction) -> None:
         # This will active the item to be used.
         raise NotImplementedError()
+
+    def clone(self) -> Consumable:
+        """Return a copy of this component, the Item it is given to becomes its parent."""
+        # Consumables only hold plain values, so a shallow copy is enough.
+        return copy.copy(self)
     
     def consume(self) -> None:
         """Remove the consumed item from its containing inventory."""
@@ -32,6 +40,8 @@ class Consumable(BaseComponent):
             inventory.items.remove(entity)
 
 class HealingConsumable(Consumable):
+    __slots__ = ("amount",)
+
     def __init__(self, amount: int):
         self.amount = amount
     
@@ -49,6 +59,8 @@ class HealingConsumable(Consumable):
             raise Impossible(f"Your health is already full.")
 
 class BombDamageConsumable(Consumable):
+    __slots__ = ("damage", "radius")
+
     def __init__(self, damage: int, radius:int):
         self.damage = damage
         self.radius = radius
@@ -65,39 +77,33 @@ class BombDamageConsumable(Consumable):
     def activate(self, action: actions.ItemAction) -> None:
         target_xy = action.target_xy
 
-        if not self.engine.game_map.visible[target_xy]:
+        if not self.engine.game_map.is_visible(*target_xy):
             raise Impossible("You cannot target an area that you cannot see.")
 
         targets_hit = False
-        for actor in self.engine.game_map.actors:
-            if actor.distance(*target_xy) <= self.radius:
-                self.engine.message_log.add_message(
-                    f"The {actor.name} is engulfed in an explosion, taking {self.damage} damage!"
-                )
-                actor.fighter.take_damage(self.damage)
-                targets_hit = True
+        for actor in self.engine.game_map.actors_within(*target_xy, self.radius):
+            self.engine.message_log.add_message(
+                f"The {actor.name} is engulfed in an explosion, taking {self.damage} damage!"
+            )
+            actor.fighter.take_damage(self.damage)
+            targets_hit = True
 
         if not targets_hit:
             raise Impossible("There are no targets in the radius.")
         self.consume()
 
 class LightningDmgConsumable(Consumable):
+    __slots__ = ("damage", "max_range")
+
     def __init__(self, damage: int, max_range: int):
         self.damage = damage
         self.max_range = max_range
     
     def activate(self, action: actions.ItemAction) -> None:
         consumer = action.entity
-        target = None
-        closest_distance = self.max_range + 1.0
-
-        for actor in self.engine.game_map.actors:
-            if actor is not consumer and self.parent.gamemap.visible[actor.x, actor.y]:
-                distance = consumer.distance(actor.x, actor.y)
-
-                if distance < closest_distance:
-                    target = actor
-                    closest_distance = distance
+        target = self.engine.game_map.nearest_visible_actor(
+            consumer.x, consumer.y, self.max_range, exclude=consumer
+        )
 
         if target:
             self.engine.message_log.add_message(
@@ -109,6 +115,8 @@ class LightningDmgConsumable(Consumable):
             raise Impossible("No enemy is close enough to strike.")
 
 class ConfusionConsumable(Consumable):
+    __slots__ = ("number_of_turns",)
+
     def __init__(self, number_of_turns: int):
         self.number_of_turns = number_of_turns
 
@@ -125,7 +133,7 @@ class ConfusionConsumable(Consumable):
         consumer = action.entity
         target = action.target_actor
 
-        if not self.engine.game_map.visible[action.target_xy]:
+        if not self.engine.game_map.is_visible(*action.target_xy):
             raise Impossible("You cannot target an area that you cannot see.")
         if not target:
             raise Impossible("You must select an enemy to target.")
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
+from typing import Optional, TYPE_CHECKING
 
 import color
 
@@ -8,16 +8,44 @@ from components.base_component import BaseComponent
 from render_order import RenderOrder
 
 if TYPE_CHECKING:
+    from actor_store import ActorStore
     from Entity import Actor
 
 class Fighter(BaseComponent):
+    __slots__ = ("store", "_max_hp", "_hp", "_defense", "_power")
+
     parent: Actor
 
     def __init__(self, hp: int, defense: int, power: int):
-        self.max_hp = hp
+        # Store of the map the parent is on, set by the store itself.
+        self.store: Optional[ActorStore] = None
+        self._max_hp = hp
         self._hp = hp
-        self.defense = defense
-        self.power = power
+        self._defense = defense
+        self._power = power
+
+    def __getstate__(self) -> dict:
+        state = super().__getstate__()
+        state["store"] = None  # Reattached when the map rebuilds its store on load.
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        for name in ("max_hp", "defense", "power"):
+            if name in state:  # Saved before these became properties.
+                state["_" + name] = state.pop(name)
+        state.setdefault("store", None)
+        super().__setstate__(state)
+
+    def clone(self) -> Fighter:
+        """Return a copy of this component without a parent."""
+        clone = Fighter(hp=self.max_hp, defense=self.defense, power=self.power)
+        clone._hp = self._hp
+        return clone
+
+    def _stats_changed(self) -> None:
+        # Write the new stats through to the actor store.
+        if self.store is not None:
+            self.store.update_stats(self.parent)
 
     @property
     def hp(self) -> int:
@@ -26,8 +54,36 @@ class Fighter(BaseComponent):
     @hp.setter
     def hp(self, value: int) -> None:
         self._hp = max(0, min(value, self.max_hp))
+        self._stats_changed()
         if self._hp == 0 and self.parent.ai:
             self.die()
+
+    @property
+    def max_hp(self) -> int:
+        return self._max_hp
+
+    @max_hp.setter
+    def max_hp(self, value: int) -> None:
+        self._max_hp = value
+        self._stats_changed()
+
+    @property
+    def defense(self) -> int:
+        return self._defense
+
+    @defense.setter
+    def defense(self, value: int) -> None:
+        self._defense = value
+        self._stats_changed()
+
+    @property
+    def power(self) -> int:
+        return self._power
+
+    @power.setter
+    def power(self, value: int) -> None:
+        self._power = value
+        self._stats_changed()
     
     def die(self) -> None:
         if self.engine.player is self.parent:
@@ -43,6 +99,7 @@ class Fighter(BaseComponent):
         self.parent.ai = None
         self.parent.name = f"remains of {self.parent.name}"
         self.parent.render_order = RenderOrder.CORPSE
+        self.gamemap.on_actor_death(self.parent)
 
         self.engine.message_log.add_message(death_message, death_message_color)
         self.engine.player.level.add_xp(self.parent.level.xp_given)
@@ -64,4 +121,6 @@ class Fighter(BaseComponent):
         return amount_recovered
     
     def take_damage(self, amount: int) -> None:
-        self.hp -= amount
\ No newline at end of file
+        self.hp -= amount
+        if self.store is not None and self.parent.ai:
+            self.gamemap.wake_actor(self.parent)  # Being hurt wakes up a parked actor.
\ No newline at end of file
@@ -8,12 +8,23 @@ if TYPE_CHECKING:
     from Entity import Actor, Item
 
 class Inventory(BaseComponent):
+    __slots__ = ("capacity", "items")
+
     parent: Actor
 
     def __init__(self, capacity: int):
         self.capacity = capacity
         self.items: List[Item] = []
 
+    def clone(self) -> Inventory:
+        """Return a copy of this component, and of the items in it, without a parent."""
+        clone = Inventory(self.capacity)
+        for item in self.items:
+            item_clone = item.clone()
+            item_clone.parent = clone
+            clone.items.append(item_clone)
+        return clone
+
     def drop(self, item: Item) -> None:
         # Removes an item from an inventory and puts it on the game map at the player's coordinates
         self.items.remove(item)
@@ -8,6 +8,8 @@ if TYPE_CHECKING:
     from Entity import Actor
 
 class Level(BaseComponent):
+    __slots__ = ("current_level", "current_xp", "level_up_base", "level_up_factor", "xp_given")
+
     parent: Actor
 
     def __init__(
@@ -24,6 +26,16 @@ class Level(BaseComponent):
         self.level_up_factor = level_up_factor
         self.xp_given = xp_given
     
+    def clone(self) -> Level:
+        """Return a copy of this component without a parent."""
+        return Level(
+            current_level=self.current_level,
+            current_xp=self.current_xp,
+            level_up_base=self.level_up_base,
+            level_up_factor=self.level_up_factor,
+            xp_given=self.xp_given,
+        )
+
     @property 
     def experience_to_next_level(self) -> int:
         return self.level_up_base + self.current_level * self.level_up_factor
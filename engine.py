@@ -1,52 +1,156 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any, Optional, Tuple
 
+import tcod
 from tcod.console import Console
 from tcod.map import compute_fov
 
 import exceptions
+import profiler
 import render_functions
 from message_log import MessageLog
 
-import lzma
-import pickle
-
 if TYPE_CHECKING:
+ from autosave import Autosaver
  from Entity import Entity
  from game_map import GameMap, GameWorld
 
+# The part of the screen showing the map, above the status panel.
+VIEW_WIDTH = 80
+VIEW_HEIGHT = 43
+
+FOV_RADIUS = 8
+# Enemies further than this from the player (on either axis) don't path toward them.
+PATH_RADIUS = 40
+# Enemies further than this from the player are parked on large maps, see
+# GameMap.update_dormancy.  Every enemy of a regular floor is close enough to matter.
+ACTIVITY_RADIUS = PATH_RADIUS
+
 class Engine: 
     game_map: GameMap
     game_world: GameWorld
 
-    def __init__(self, player: Entity):
+    def __init__(self, player: Entity, message_history_path: Optional[str] = None):
         self.player = player
-        self.message_log = MessageLog()
-        self.mouse_location = (0, 0)
+        self.message_log = MessageLog(history_path=message_history_path)
+        self.mouse_location = (0, 0)  # In map coordinates.
+        # Map coordinates of the tile drawn at the top left of the screen.
+        self.camera = (0, 0)
+        # Shared pathfinder toward the player, built at most once per enemy turn.
+        self.player_pathfinder: Optional[tcod.path.Pathfinder] = None
+        # Map coordinates of the pathfinder's (0, 0), it only covers the area around the player.
+        self.player_path_origin = (0, 0)
+        # None to give every living enemy a turn, even the ones with nothing to do.
+        self.activity_radius: Optional[int] = ACTIVITY_RADIUS
+        # Saves the game in the background during interactive sessions.
+        self.autosaver: Optional[Autosaver] = None
+        # What the current FOV was computed from: the map, its tiles version, origin and radius.
+        # update_fov does nothing while these are unchanged, e.g. after waiting or using an item.
+        self._fov_key: Optional[Tuple[Any, ...]] = None
+        self.fov_hits = 0
+        self.fov_recomputes = 0
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state["autosaver"] = None  # Owns a thread, attached again by the session.
+        state["_fov_key"] = None
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self.__dict__.setdefault("player_pathfinder", None)
+        self.__dict__.setdefault("player_path_origin", (0, 0))
+        self.__dict__.setdefault("camera", (0, 0))
+        self.__dict__.setdefault("activity_radius", ACTIVITY_RADIUS)
+        self.__dict__.setdefault("_fov_key", None)
+        self.__dict__.setdefault("fov_hits", 0)
+        self.__dict__.setdefault("fov_recomputes", 0)
+        self.__dict__.setdefault("autosaver", None)
+        self.game_map.restore_caches()
+        self.game_world.restore_caches()
 
     def handle_enemy_turns(self) -> None:
-        for entity in set(self.game_map.actors) - {self.player}:
-            if entity.ai:
-               try:
-                entity.ai.perform()
-               except exceptions.Impossible:
-                  pass # Ignore impossible actions
+        if self.activity_radius is not None:
+            radius = self.activity_radius if self.game_map.is_large else None
+            self.game_map.update_dormancy(self.player.x, self.player.y, radius)
+        else:
+            self.game_map.wake_all()
+        try:
+            for entity in self.game_map.scheduler.take_turn():
+                if entity.ai:
+                   try:
+                    with profiler.timed("ai", type(entity.ai).__name__):
+                        entity.ai.perform()
+                   except exceptions.Impossible:
+                      pass # Ignore impossible actions
+        finally:
+            self.player_pathfinder = None  # Stale once the turn is over.
+
+    def get_player_pathfinder(self) -> tcod.path.Pathfinder:
+        """Return a pathfinder rooted at the player, shared by every enemy this turn."""
+        if self.player_pathfinder is None:
+            profiler.count("pathfinder")
+            window = self.game_map.radius_window(self.player.x, self.player.y, PATH_RADIUS)
+            xs, ys = window
+            graph = tcod.path.SimpleGraph(
+                cost=self.game_map.get_path_cost(window), cardinal=2, diagonal=3
+            )
+            self.player_pathfinder = tcod.path.Pathfinder(graph)
+            self.player_path_origin = xs.start, ys.start
+            self.player_pathfinder.add_root((self.player.x - xs.start, self.player.y - ys.start))
+            self.player_pathfinder.resolve()
+        return self.player_pathfinder
 
     def update_fov(self) -> None:
         #Recompute the visible area based on the players point of view.
-        self.game_map.visible[:] = compute_fov(
-            self.game_map.tiles["transparent"],
-            (self.player.x, self.player.y),
-            radius=8,
+        # Only the tiles within the FOV radius are looked at, however large the map is.
+        x, y = self.player.x, self.player.y
+        self.game_map.set_focus(x, y)
+        key = (self.game_map, self.game_map.tiles_version, x, y, FOV_RADIUS)
+        if key == self._fov_key:
+            self.fov_hits += 1
+            profiler.count("fov_hit")
+            return
+        self._fov_key = key
+        self.fov_recomputes += 1
+        profiler.count("fov_recompute")
+        window = self.game_map.radius_window(x, y, FOV_RADIUS)
+        xs, ys = window
+        self.game_map.update_visible(
+            compute_fov(
+                self.game_map.get_tiles(window)["transparent"],
+                (x - xs.start, y - ys.start),
+                radius=FOV_RADIUS,
+            ),
+            window,
         )
-        # If a tile is "visible" it should be added to "explored".
-        self.game_map.explored |= self.game_map.visible
-    
+
+    def update_camera(self) -> None:
+        """Center the view on the player, without showing anything past the edges of the map."""
+        x = self.player.x - VIEW_WIDTH // 2
+        y = self.player.y - VIEW_HEIGHT // 2
+        self.camera = (
+            max(0, min(x, self.game_map.width - VIEW_WIDTH)),
+            max(0, min(y, self.game_map.height - VIEW_HEIGHT)),
+        )
+
+    def screen_to_map(self, x: int, y: int) -> Tuple[int, int]:
+        """Return the map position drawn at (x, y) on the screen, or (-1, -1) outside the view."""
+        if not (0 <= x < VIEW_WIDTH and 0 <= y < VIEW_HEIGHT):
+            return -1, -1
+        return x + self.camera[0], y + self.camera[1]
+
+    def map_to_screen(self, x: int, y: int) -> Tuple[int, int]:
+        return x - self.camera[0], y - self.camera[1]
+
     def render(self, console: Console) -> None:
-       self.game_map.render(console)
+       self.update_camera()
+       with profiler.timed("phase", "render_map"):
+           self.game_map.render(console, *self.camera, VIEW_WIDTH, VIEW_HEIGHT)
 
-       self.message_log.render(console=console, x=21, y=45, width=40, height=5)
+       with profiler.timed("phase", "render_messages"):
+           self.message_log.render(console=console, x=21, y=45, width=40, height=5)
        
        render_functions.render_bar(
           console=console,
@@ -65,8 +169,8 @@ class Engine:
             console=console, x=21, y=44, engine=self
         )
        
-    def save_as(self, filename: str) -> None:
-        """Save this Engine instance as a compressed file."""
-        save_data = lzma.compress(pickle.dumps(self))
-        with open(filename, "wb") as f:
-            f.write(save_data)
\ No newline at end of file
+    def save_as(self, filename: str, codec: str = "zlib", level: int = 6) -> None:
+        """Save this Engine instance as a compressed file, see savefile.py for the format."""
+        import savefile
+
+        savefile.save(self, filename, codec=codec, level=level)
\ No newline at end of file
@@ -4,4 +4,6 @@ class Impossible(Exception):
     The reason is given as the exception message.
     """
 class QuitWithoutSaving(SystemExit):
-    """Can be raised to exit the game without automatically saving."""
\ No newline at end of file
+    """Can be raised to exit the game without automatically saving."""
+class SaveFormatError(Exception):
+    """Raised when a save file is damaged or can't be read by this version of the game."""
@@ -1,97 +1,615 @@
 from __future__ import annotations
 
-from typing import Iterable, TYPE_CHECKING, Optional, Iterator
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+import os
+import shutil
+import tempfile
+from typing import Any, Dict, Iterable, List, TYPE_CHECKING, Optional, Iterator, Set, Tuple
+import weakref
 
 import numpy as np
 from tcod.console import Console
 
+from actor_store import ActorStore
+import profiler
 from Entity import Actor, Item
+from render_order import RenderOrder
 import tile_types
+from turn_scheduler import TurnScheduler
 
 if TYPE_CHECKING:
     from engine import Engine
     from Entity import Entity
 
+# Builds upcoming floors in the background while the current one is being played.
+floor_builder = ThreadPoolExecutor(max_workers=1, thread_name_prefix="floor-builder")
+
+# Maps with at least this many tiles keep no caches the size of the whole map: path costs are
+# built for the window asked for and the view is drawn from scratch every frame, so a large
+# memory-mapped map is only paged in around the player.
+LARGE_MAP_TILES = 256 * 256
+
 class GameMap:
     def __init__(
-        self, engine: Engine, width: int, height: int, entities: Iterable[Entity] = ()
+        self,
+        engine: Engine,
+        width: int,
+        height: int,
+        entities: Iterable[Entity] = (),
+        *,
+        tiles: Optional[np.ndarray] = None,
+        visible: Optional[np.ndarray] = None,
+        explored: Optional[np.ndarray] = None,
+        visible_window: Optional[Tuple[slice, slice]] = None,
     ):
+        """Create a map of walls, or a map using existing `tiles`, `visible` and `explored` arrays.
+
+        Existing arrays, such as ones memory-mapped from a save file, are used without copying.
+        `visible_window` is the part of an existing `visible` array which can hold visible
+        tiles, by default all of it.
+        """
         self.engine = engine
         self.width, self.height = width, height
-        self.entities = set(entities)
-        self.tiles = np.full((width, height), fill_value=tile_types.wall, order="F")
-
-        self.visible = np.full(
-            (width, height), fill_value=False, order="F"
-        )  # Tiles the player can currently see
-        self.explored = np.full(
-            (width, height), fill_value=False, order="F"
-        )  # Tiles the player has seen before
+        # An insertion-ordered set, so iteration order (and so turn order) is reproducible.
+        self.entities: Dict[Entity, None] = dict.fromkeys(entities)
+        # Tile-keyed index of entities, kept up to date by add/remove/move_entity.
+        self._entity_index: Dict[Tuple[int, int], List[Entity]] = {}
+        # Entities grouped by RenderOrder, with cached coordinate and glyph arrays per group.
+        self._render_buckets: Dict[RenderOrder, Dict[Entity, None]] = {}
+        self._bucket_arrays: Dict[RenderOrder, Tuple[np.ndarray, ...]] = {}
+        # Array copy of every actor's position and stats, for vectorized queries.
+        self.actor_store = ActorStore()
+        # The living actors other than the player, in the order they take their turns.
+        # Dormant actors are suspended in it, see update_dormancy.
+        self.scheduler = TurnScheduler()
+        # Actors parked for being far away which still had something to do when parked.
+        self._parked_busy: Dict[Actor, None] = {}
+        self._rebuild_entity_index()
+        # Cached pathfinding costs, built on first use and invalidated by mark_tiles_changed.
+        self._path_cost: Optional[np.ndarray] = None
+        # Bumped by mark_tiles_changed, so cached data derived from the tiles can tell it is stale.
+        self.tiles_version = 0
+        self._init_tiles(tiles, visible, explored)
+        if visible_window is not None:
+            self._visible_window = visible_window
 
         self.upstairs_location = (0, 0)
+        self.downstairs_location: Optional[Tuple[int, int]] = None  # None on the first floor.
+        self.entry_location = (0, 0)  # Where the player arrives on this floor from below.
+
+        self._reset_render_cache()
+
+    def _init_tiles(
+        self, tiles: Optional[np.ndarray], visible: Optional[np.ndarray], explored: Optional[np.ndarray]
+    ) -> None:
+        # Set up the tile arrays, the only storage maps of other shapes need to replace.
+        if tiles is None:
+            tiles = np.full((self.width, self.height), fill_value=tile_types.wall, order="F")
+        self.tiles = tiles
+
+        # The part of the map update_visible last changed, only it can hold visible tiles.
+        self._visible_window = self.clip_window(0, 0, self.width, self.height)
+        if visible is None:
+            visible = np.full((self.width, self.height), fill_value=False, order="F")
+            self._visible_window = self.clip_window(0, 0, 0, 0)
+        self.visible = visible  # Tiles the player can currently see
+        if explored is None:
+            explored = np.full((self.width, self.height), fill_value=False, order="F")
+        self.explored = explored  # Tiles the player has seen before
+
+    @property
+    def is_large(self) -> bool:
+        """Whether this map is too large to keep caches covering all of it, see LARGE_MAP_TILES."""
+        return self.width * self.height >= LARGE_MAP_TILES
+
+    def _reset_render_cache(self) -> None:
+        # The map as last drawn, and the tiles which have changed since then.
+        # Large maps have neither, they draw the view from scratch.
+        self._graphics: Optional[np.ndarray] = None
+        self._dirty: Optional[np.ndarray] = None
+        if self.is_large:
+            return
+        self._graphics = np.full(
+            (self.width, self.height), fill_value=tile_types.SHROUD, order="F"
+        )
+        self._dirty = np.full((self.width, self.height), fill_value=True, order="F")
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        # The entity index is derived data, rebuild it on load instead of saving it.
+        del state["_entity_index"]
+        del state["_render_buckets"]
+        del state["_bucket_arrays"]
+        del state["actor_store"]
+        del state["scheduler"]
+        del state["_parked_busy"]
+        del state["_graphics"]
+        del state["_dirty"]
+        state["_path_cost"] = None
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        if isinstance(self.entities, set):  # Saved before entities were ordered.
+            self.entities = dict.fromkeys(self.entities)
+        self.__dict__.setdefault("entry_location", self.upstairs_location)
+        self.__dict__.setdefault("downstairs_location", None)
+        self.__dict__.setdefault("_visible_window", self.clip_window(0, 0, self.width, self.height))
+        self.__dict__.setdefault("tiles_version", 0)
+        # The entities may not be unpickled yet (they refer back to this map), so the
+        # derived data is rebuilt by restore_caches once the whole Engine is loaded.
+
+    def restore_caches(self) -> None:
+        """Rebuild the data which isn't pickled, after this map and its entities are loaded."""
+        self._entity_index = {}
+        self._render_buckets = {}
+        self._bucket_arrays = {}
+        self.actor_store = ActorStore()
+        self.scheduler = TurnScheduler()
+        self._parked_busy = {}
+        self._rebuild_entity_index()
+        self._path_cost = None
+        self._reset_render_cache()
+
+    def _rebuild_entity_index(self) -> None:
+        self._entity_index.clear()
+        self._render_buckets = {order: {} for order in RenderOrder}
+        self._bucket_arrays.clear()
+        for entity in self.entities:
+            self._entity_index.setdefault((entity.x, entity.y), []).append(entity)
+            self._render_buckets[entity.render_order][entity] = None
+            if isinstance(entity, Actor):
+                self.actor_store.add(entity)
+                self._schedule(entity)
+
+    def _schedule(self, actor: Actor) -> None:
+        # The player's turns come from input, not from the scheduler.
+        if actor.is_alive and actor is not self.engine.player:
+            self.scheduler.add(actor)
 
     @property
     def gamemap(self) -> GameMap:
         return self
 
+    def add_entity(self, entity: Entity) -> None:
+        """Add an entity to this map at its current location."""
+        if entity in self.entities:
+            return
+        self.entities[entity] = None
+        self._entity_index.setdefault((entity.x, entity.y), []).append(entity)
+        self._render_buckets[entity.render_order][entity] = None
+        self._bucket_arrays.pop(entity.render_order, None)
+        if isinstance(entity, Actor):
+            self.actor_store.add(entity)
+            self._schedule(entity)
+        self._mark_dirty(entity.x, entity.y)
+        if entity.blocks_movement:
+            self._add_blocking_cost(entity.x, entity.y, 1)
+
+    def remove_entity(self, entity: Entity) -> None:
+        """Remove an entity from this map."""
+        del self.entities[entity]
+        location = entity.x, entity.y
+        tile_entities = self._entity_index[location]
+        tile_entities.remove(entity)
+        if not tile_entities:
+            del self._entity_index[location]
+        del self._render_buckets[entity.render_order][entity]
+        self._bucket_arrays.pop(entity.render_order, None)
+        if isinstance(entity, Actor):
+            self.actor_store.remove(entity)
+            self.scheduler.remove(entity)
+            self._parked_busy.pop(entity, None)
+        self._mark_dirty(*location)
+        if entity.blocks_movement:
+            self._add_blocking_cost(entity.x, entity.y, -1)
+
+    def move_entity(self, entity: Entity, x: int, y: int) -> None:
+        """Move an entity on this map to a new location, updating the index."""
+        # Like remove_entity then add_entity, except the entity keeps its place in the
+        # turn order and its actor store row.
+        location = entity.x, entity.y
+        tile_entities = self._entity_index[location]
+        tile_entities.remove(entity)
+        if not tile_entities:
+            del self._entity_index[location]
+        self._mark_dirty(*location)
+        if entity.blocks_movement:
+            self._add_blocking_cost(*location, -1)
+
+        entity.x = x
+        entity.y = y
+        # Moved entities go last, as if they had been added again.
+        del self.entities[entity]
+        self.entities[entity] = None
+        bucket = self._render_buckets[entity.render_order]
+        del bucket[entity]
+        bucket[entity] = None
+        self._bucket_arrays.pop(entity.render_order, None)
+        self._entity_index.setdefault((x, y), []).append(entity)
+        if isinstance(entity, Actor):
+            self.actor_store.update(entity)
+        self._mark_dirty(x, y)
+        if entity.blocks_movement:
+            self._add_blocking_cost(x, y, 1)
+
+    def get_entities_at(self, x: int, y: int) -> List[Entity]:
+        """Return the entities at the given location."""
+        return self._entity_index.get((x, y), [])
+
     @property
     def actors(self) -> Iterator[Actor]:
         #Iterate over this maps living actors.
-        yield from (
-            entity
-            for entity in self.entities
-            if isinstance(entity, Actor) and entity.is_alive
-        )
+        # They come in actor store row order: the order they were added to the map, except
+        # that actors added after others left take the freed rows.  Before the store, this
+        # followed `entities`, where an entity moved to the end every time it moved.
+        # Not an entity scan, this only walks the store's living rows.
+        profiler.count("actor_iteration")
+        store = self.actor_store
+        yield from (store.actors[row] for row in store.living_rows().tolist())
 
     @property
     def items(self) -> Iterator[Item]:
+        profiler.count("entity_scan")
         yield from (entity for entity in self.entities if isinstance(entity, Item))
 
     def get_blocking_entity_at(
         self, location_x: int, location_y: int,
     ) -> Optional[Entity]:
-        for entity in self.entities:
-            if (
-                entity.blocks_movement
-                and entity.x == location_x
-                and entity.y == location_y
-            ):
+        for entity in self.get_entities_at(location_x, location_y):
+            if entity.blocks_movement:
                 return entity
         
         return None
     
     def get_actor_at(self, x: int, y: int) -> Optional[Actor]:
-        for actor in self.actors:
-            if actor.x == x and actor.y == y:
-                return actor
+        for entity in self.get_entities_at(x, y):
+            if isinstance(entity, Actor) and entity.is_alive:
+                return entity
         return None
 
+    def actors_within(self, x: int, y: int, radius: float) -> List[Actor]:
+        """Return the living actors within `radius` of (x, y), by straight line distance."""
+        profiler.count("actor_query")
+        store = self.actor_store
+        rows = store.living_rows()
+        dx = store.x[rows] - x
+        dy = store.y[rows] - y
+        return [store.actors[row] for row in rows[dx * dx + dy * dy <= radius * radius].tolist()]
+
+    def nearest_visible_actor(
+        self, x: int, y: int, max_range: float, exclude: Optional[Actor] = None
+    ) -> Optional[Actor]:
+        """Return the closest living actor the player can see, less than `max_range` + 1 from (x, y).
+
+        Distance is by straight line.  Of actors at the same distance, the one in the lowest
+        actor store row wins, which is the first of them GameMap.actors yields.
+        """
+        profiler.count("actor_query")
+        store = self.actor_store
+        rows = store.living_rows()
+        if exclude is not None and exclude in store.rows:
+            rows = rows[rows != store.rows[exclude]]
+        xs = store.x[rows]
+        ys = store.y[rows]
+        distance2 = (xs - x) ** 2 + (ys - y) ** 2
+        candidates = (distance2 < (max_range + 1) ** 2) & self.visible_at(xs, ys)
+        if not candidates.any():
+            return None
+        rows = rows[candidates]
+        return store.actors[int(rows[np.argmin(distance2[candidates])])]
+
+    def on_actor_death(self, actor: Actor) -> None:
+        """Update cached data after an actor on this map has died and stopped blocking."""
+        self._add_blocking_cost(actor.x, actor.y, -1)
+        self._mark_dirty(actor.x, actor.y)
+        # Its render order changed, so move it to the corpse bucket.
+        for order, bucket in self._render_buckets.items():
+            if actor in bucket:
+                del bucket[actor]
+                self._bucket_arrays.pop(order, None)
+        self._render_buckets[actor.render_order][actor] = None
+        self._bucket_arrays.pop(actor.render_order, None)
+        self.actor_store.update(actor)
+        self.scheduler.remove(actor)
+        self._parked_busy.pop(actor, None)
+        self.actor_store.dormant[self.actor_store.rows[actor]] = False
+
+    def update_dormancy(self, x: int, y: int, radius: Optional[int]) -> None:
+        """Park the actors which can't do anything useful this turn, and wake the ones which can.
+
+        Actors further than `radius` (on either axis) from (x, y) are parked, unless their AI
+        counts down turns (see BaseAI.has_timer), as are actors the player can't see whose AI
+        is idle (see BaseAI.is_idle).  Parked actors are woken once they are within `radius`
+        and either visible or still busy, or when they take damage (see wake_actor).  With no
+        `radius` only idle actors are parked.  Called at the start of every enemy turn.
+        """
+        store = self.actor_store
+        rows = store.living_rows()
+        player_row = store.rows.get(self.engine.player)
+        if player_row is not None:
+            rows = rows[rows != player_row]
+        xs = store.x[rows]
+        ys = store.y[rows]
+        if radius is None:
+            near = np.ones(len(rows), dtype=bool)
+        else:
+            near = np.maximum(np.abs(xs - x), np.abs(ys - y)) <= radius
+        visible = self.visible_at(xs, ys)
+        dormant = store.dormant[rows]
+
+        for row in rows[dormant & near & visible].tolist():
+            self.wake_actor(store.actors[row])
+        for actor in list(self._parked_busy):
+            if radius is None or max(abs(actor.x - x), abs(actor.y - y)) <= radius:
+                self.wake_actor(actor)
+
+        # Only the awake actors out of sight need their AI asked, usually a handful.
+        candidates = ~dormant & ~(near & visible)
+        for row, is_near in zip(rows[candidates].tolist(), near[candidates].tolist()):
+            actor = store.actors[row]
+            idle = actor.ai.is_idle()
+            if not idle and (is_near or actor.ai.has_timer()):
+                continue  # Out of sight, but still on its way somewhere or counting down.
+            store.dormant[row] = True
+            self.scheduler.suspend(actor)
+            if not idle:
+                self._parked_busy[actor] = None
+
+    def wake_actor(self, actor: Actor) -> None:
+        """Schedule a parked actor again, does nothing to actors which aren't parked."""
+        store = self.actor_store
+        row = store.rows.get(actor)
+        if row is None or not store.dormant[row]:
+            return
+        store.dormant[row] = False
+        self._parked_busy.pop(actor, None)
+        self.scheduler.resume(actor)
+
+    def wake_all(self) -> None:
+        """Wake every parked actor."""
+        store = self.actor_store
+        for row in np.nonzero(store.dormant[: store.size])[0].tolist():
+            self.wake_actor(store.actors[row])
+
+    @property
+    def dormant_count(self) -> int:
+        store = self.actor_store
+        return int(np.count_nonzero(store.dormant[: store.size]))
+
+    def _mark_dirty(self, x: int, y: int) -> None:
+        # The tile needs to be drawn again.
+        if self._dirty is not None:
+            self._dirty[x, y] = True
+
+    def mark_tiles_changed(self) -> None:
+        """Must be called after `tiles` is modified so that cached data is rebuilt."""
+        self.tiles_version += 1
+        self._path_cost = None
+        if self._dirty is not None:
+            self._dirty[:] = True
+
+    def clip_window(self, x1: int, y1: int, x2: int, y2: int) -> Tuple[slice, slice]:
+        """Return the part of the area from (x1, y1) up to (x2, y2) inside the map, as array slices."""
+        x1 = min(max(x1, 0), self.width)
+        y1 = min(max(y1, 0), self.height)
+        return slice(x1, min(max(x2, x1), self.width)), slice(y1, min(max(y2, y1), self.height))
+
+    def radius_window(self, x: int, y: int, radius: int) -> Tuple[slice, slice]:
+        """Return the square of tiles within `radius` of (x, y), clipped to the map."""
+        return self.clip_window(x - radius, y - radius, x + radius + 1, y + radius + 1)
+
+    def set_focus(self, x: int, y: int) -> None:
+        """Called with the player's location after every turn, before FOV is updated."""
+
+    def is_walkable(self, x: int, y: int) -> bool:
+        return bool(self.tiles["walkable"][x, y])
+
+    def is_visible(self, x: int, y: int) -> bool:
+        return bool(self.visible[x, y])
+
+    def visible_at(self, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        """Return whether the player can see each of the given positions."""
+        return self.visible[xs, ys]
+
+    def get_tiles(self, window: Tuple[slice, slice]) -> np.ndarray:
+        """Return the tiles of a window of the map, read-only."""
+        return self.tiles[window]
+
+    def get_visible(self, window: Tuple[slice, slice]) -> np.ndarray:
+        """Return which tiles of a window the player can see."""
+        return self.visible[window]
+
+    @property
+    def visible_window(self) -> Tuple[slice, slice]:
+        """The part of the map update_visible last set, no tile outside it is visible."""
+        return self._visible_window
+
+    def get_explored(self, window: Tuple[slice, slice]) -> np.ndarray:
+        """Return which tiles of a window the player has seen before."""
+        return self.explored[window]
+
+    def update_visible(self, visible: np.ndarray, window: Optional[Tuple[slice, slice]] = None) -> None:
+        """Set the tiles the player can currently see, and add them to the explored tiles.
+
+        `visible` covers `window`, every tile outside it becomes not visible.  Only the old
+        and new windows are touched, so the cost depends on the FOV radius, not the map size.
+        """
+        if window is None:
+            window = self.clip_window(0, 0, self.width, self.height)
+        old_xs, old_ys = self._visible_window
+        xs, ys = window
+        # Both windows together, which is where visibility can change.
+        changed = self.clip_window(
+            min(old_xs.start, xs.start) if old_xs.stop > old_xs.start else xs.start,
+            min(old_ys.start, ys.start) if old_ys.stop > old_ys.start else ys.start,
+            max(old_xs.stop, xs.stop),
+            max(old_ys.stop, ys.stop),
+        )
+        before = self.visible[changed].copy() if self._dirty is not None else None
+        self.visible[self._visible_window] = False
+        self.visible[window] = visible
+        if self._dirty is not None:
+            self._dirty[changed] |= before != self.visible[changed]
+        self._visible_window = window
+        # If a tile is "visible" it should be added to "explored".
+        self.explored[window] |= visible
+
+    def _add_blocking_cost(self, x: int, y: int, sign: int) -> None:
+        # Keep the cached cost array in sync as blocking entities come and go.
+        if self._path_cost is not None and self.tiles["walkable"][x, y]:
+            self._path_cost[x, y] += 10 * sign
+
+    def get_path_cost(self, window: Optional[Tuple[slice, slice]] = None) -> np.ndarray:
+        """Return the pathfinding cost array for this map, or for a window of it.
+
+        Walls cost 0 (impassable), floors cost 1 and tiles with a blocking entity cost extra.
+        The array is cached and updated in place, so callers must treat it as read-only.
+        Large maps build only the window on every call instead.
+        """
+        if window is not None and self.is_large:
+            return self._build_path_cost(window)
+        if self._path_cost is None:
+            # Copy the walkable array.
+            cost = np.array(self.tiles["walkable"], dtype=np.int8)
+            profiler.count("entity_scan")
+
+            for entity in self.entities:
+                # Check that an enitiy blocks movement and the cost isn't zero (blocking.)
+                if entity.blocks_movement and cost[entity.x, entity.y]:
+                    # Add to the cost of a blocked position.
+                    # A lower number means more enemies will crowd behind each other in
+                    # hallways.  A higher number means enemies will take longer paths in
+                    # order to surround the player.
+                    cost[entity.x, entity.y] += 10
+
+            self._path_cost = cost
+
+        if window is not None:
+            return self._path_cost[window]
+        return self._path_cost
+
+    def _build_path_cost(self, window: Tuple[slice, slice]) -> np.ndarray:
+        # The costs of a window, from its tiles and the actor store, so only the window is read.
+        xs, ys = window
+        cost = np.array(self.get_tiles(window)["walkable"], dtype=np.int8)
+        # Living actors are the only entities which block movement.
+        store = self.actor_store
+        rows = store.living_rows()
+        x = store.x[rows] - xs.start
+        y = store.y[rows] - ys.start
+        inside = (0 <= x) & (x < cost.shape[0]) & (0 <= y) & (y < cost.shape[1])
+        x, y = x[inside], y[inside]
+        cost[x, y] += 10 * (cost[x, y] != 0)
+        return cost
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by the arrays of this map, the bulk of its size."""
+        arrays = [self.tiles, self.visible, self.explored, self._graphics, self._dirty, self._path_cost]
+        return sum(array.nbytes for array in arrays if array is not None)
+
     def in_bounds(self, x: int, y: int) -> bool:
         # Checks if something is in the bounds of the map & returns true if so
         return 0 <= x < self.width and 0 <= y < self.height
 
-    def render(self, console: Console) -> None:
-        # Renders the map.
+    def render(
+        self, console: Console, x: int = 0, y: int = 0, width: Optional[int] = None, height: Optional[int] = None
+    ) -> None:
+        # Renders the part of the map from (x, y) which fits in width by height, at the
+        # top left of the console.  By default the whole map is drawn.
+        # Only tiles which changed since they were last drawn are recomputed, the rest of the
+        # view is copied from the previous frame.
+        view = self.clip_window(x, y, x + (width or self.width), y + (height or self.height))
+        if self._graphics is None:
+            self._draw_view(console, view)
+            return
+        self._redraw_dirty_tiles(view)
+        xs, ys = view
+        console.tiles_rgb[0 : xs.stop - xs.start, 0 : ys.stop - ys.start] = self._graphics[view]
+
+    def _draw_view(self, console: Console, view: Tuple[slice, slice]) -> None:
+        # Draw a window of the map from scratch, reading nothing outside of it.
+        xs, ys = view
+        tiles = self.get_tiles(view)
+        visible = self.get_visible(view)
+        graphics = np.select(
+            condlist=[visible, self.get_explored(view)],
+            choicelist=[tiles["light"], tiles["dark"]],
+            default=tile_types.SHROUD,
+        )
+
+        for order in sorted(RenderOrder, key=lambda x: x.value):
+            entity_xs, entity_ys, chars, colors = self._get_bucket_arrays(order)
+            entity_xs = entity_xs - xs.start
+            entity_ys = entity_ys - ys.start
+            selected = (
+                (0 <= entity_xs) & (entity_xs < visible.shape[0]) & (0 <= entity_ys) & (entity_ys < visible.shape[1])
+            )
+            selected[selected] = visible[entity_xs[selected], entity_ys[selected]]
+            graphics["ch"][entity_xs[selected], entity_ys[selected]] = chars[selected]
+            graphics["fg"][entity_xs[selected], entity_ys[selected]] = colors[selected]
+
+        console.tiles_rgb[0 : graphics.shape[0], 0 : graphics.shape[1]] = graphics
+
+    def _redraw_dirty_tiles(self, view: Tuple[slice, slice]) -> None:
+        # Tiles outside of the view stay dirty until they are scrolled into it.
+        xs, ys = view
+        dirty_xs, dirty_ys = np.nonzero(self._dirty[view])
+        if not len(dirty_xs):
+            return
+        dirty_xs += xs.start
+        dirty_ys += ys.start
+
         # If a tile is 'visible', it will be drawn with light colors
         # If it isn't, but it has been explored, draw it with 'dark' colors
         # Otherwise it will default to SHROUD
-        console.tiles_rgb[0 : self.width, 0 : self.height] = np.select(
-            condlist=[self.visible, self.explored],
-            choicelist=[self.tiles["light"], self.tiles["dark"]],
+        self._graphics[dirty_xs, dirty_ys] = np.select(
+            condlist=[self.visible[dirty_xs, dirty_ys], self.explored[dirty_xs, dirty_ys]],
+            choicelist=[self.tiles["light"][dirty_xs, dirty_ys], self.tiles["dark"][dirty_xs, dirty_ys]],
             default=tile_types.SHROUD,
         )
 
-        entities_sorted_for_rendering = sorted(
-            self.entities, key=lambda x: x.render_order.value
-        )
+        # Draw each bucket in render order, so later buckets are drawn on top.
+        # Only entities in FOV, on tiles that were just redrawn, are drawn.
+        for order in sorted(RenderOrder, key=lambda x: x.value):
+            entity_xs, entity_ys, chars, colors = self._get_bucket_arrays(order)
+            selected = (
+                (xs.start <= entity_xs) & (entity_xs < xs.stop) & (ys.start <= entity_ys) & (entity_ys < ys.stop)
+            )
+            selected[selected] = self._dirty[entity_xs[selected], entity_ys[selected]] & self.visible[
+                entity_xs[selected], entity_ys[selected]
+            ]
+            self._graphics["ch"][entity_xs[selected], entity_ys[selected]] = chars[selected]
+            self._graphics["fg"][entity_xs[selected], entity_ys[selected]] = colors[selected]
+
+        self._dirty[view] = False
 
-        for entity in entities_sorted_for_rendering:
-          # Only print entities in FOV
-          if self.visible[entity.x, entity.y]:
-             console.print(x=entity.x, y=entity.y, string=entity.char, fg=entity.color)
+    def _get_bucket_arrays(self, order: RenderOrder) -> Tuple[np.ndarray, ...]:
+        # Return the x, y, char and color arrays of a render bucket, rebuilding them if needed.
+        arrays = self._bucket_arrays.get(order)
+        if arrays is None:
+            bucket = self._render_buckets[order]
+            count = len(bucket)
+            arrays = (
+                np.fromiter((entity.x for entity in bucket), dtype=np.intp, count=count),
+                np.fromiter((entity.y for entity in bucket), dtype=np.intp, count=count),
+                np.fromiter((ord(entity.char) for entity in bucket), dtype=np.int32, count=count),
+                np.array([entity.color for entity in bucket], dtype=np.uint8).reshape(count, 3),
+            )
+            self._bucket_arrays[order] = arrays
+        return arrays
 
 class GameWorld:
     # Holds the settings for gamemap and generates new maps when moving up the stairs.
+    # Visited floors are kept so the player can go back down to them.  The most recently
+    # used `max_cached_floors` floors stay in memory.  Floors the player leaves are written
+    # to `floor_dir` if it is set.  Without it, a floor is written to a temporary directory
+    # when evicted from memory, removed when the game exits.  Either way an evicted floor is
+    # loaded from disk when revisited.  Save files only keep the other floors with floor_dir.
+    # With `open_world_size` set, floors are open maps of that size stored in chunks (see
+    # chunked_map.py) instead of rooms and corridors.
 
     def __init__(
             self,
@@ -104,7 +622,11 @@ class GameWorld:
             room_max_size: int,
             max_monsters_per_room: int,
             max_items_per_room: int,
-            current_floor: int = 0
+            current_floor: int = 0,
+            seed: Optional[int] = None,
+            max_cached_floors: int = 3,
+            floor_dir: Optional[str] = None,
+            open_world_size: Optional[int] = None,
     ):
         self.engine = engine
         self.map_width = map_width
@@ -115,13 +637,185 @@ class GameWorld:
         self.max_monsters_per_room = max_monsters_per_room
         self.max_items_per_room = max_items_per_room
         self.current_floor = current_floor
+
+        if seed is None:
+            seed = int(np.random.SeedSequence().entropy)
+        # Saved with the game, so a seed plus the same inputs replays the same game.
+        self.seed = seed
+        # Used for in-game randomness such as confused enemies.
+        self.rng = np.random.default_rng(seed)
+
+        # The next floor being built in the background, as (floor number, future).
+        self._pending_floor: Optional[Tuple[int, Future[GameMap]]] = None
+
+        self.max_cached_floors = max_cached_floors
+        self.floor_dir = floor_dir
+        # Where floors are written without a floor_dir, made when first needed.
+        self._temp_floor_dir: Optional[str] = None
+        # Floors in memory which changed since they were last written to disk.
+        self._unwritten_floors: Set[int] = set()
+        self.open_world_size = open_world_size
+        self.highest_floor = current_floor  # Every floor up to this one has been visited.
+        # Floors in memory by floor number, least recently used first.
+        self._floor_cache: OrderedDict[int, GameMap] = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_evictions = 0
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        # A floor still being built can't be saved, it will be rebuilt from the seed.
+        state["_pending_floor"] = None
+        # Removed along with this world, floors written there are built again once loaded.
+        state["_temp_floor_dir"] = None
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        if "seed" not in state:  # Saved before worlds were seeded.
+            state["seed"] = int(np.random.SeedSequence().entropy)
+            state["rng"] = np.random.default_rng(state["seed"])
+        state.setdefault("_pending_floor", None)
+        # Saved before visited floors were kept.
+        state.setdefault("max_cached_floors", 3)
+        state.setdefault("floor_dir", None)
+        state.setdefault("open_world_size", None)
+        state.setdefault("highest_floor", state["current_floor"])
+        state.setdefault("_floor_cache", OrderedDict())
+        state.setdefault("_temp_floor_dir", None)
+        state.setdefault("_unwritten_floors", set())
+        for name in ("cache_hits", "cache_misses", "cache_evictions"):
+            state.setdefault(name, 0)
+        self.__dict__.update(state)
+
+    def restore_caches(self) -> None:
+        """Rebuild the derived data of the floors kept in memory, once the Engine is loaded."""
+        for game_map in self._floor_cache.values():
+            if game_map is not self.engine.game_map:  # Already restored by the Engine.
+                game_map.restore_caches()
+
+    def floor_rng(self, floor: int) -> np.random.Generator:
+        """Return the generator used to build the given floor.
+
+        Each floor gets its own stream derived from the world seed, so a floor's layout does
+        not depend on what happened during play before it was generated.
+        """
+        return np.random.default_rng([self.seed, floor])
     
     def generate_floor(self) -> None:
-        from procgen import generate_dungeon
+        """Move the player up to the next floor."""
+        self.change_floor(self.current_floor + 1)
+
+    def change_floor(self, floor: int) -> None:
+        """Move the player to the given floor, arriving on the stairs they would have used."""
+        going_up = floor > self.current_floor
+        left_floor = self.current_floor
+        left_map = self.engine.game_map if left_floor else None
+        if left_map is not None:
+            self._floor_cache[left_floor] = left_map  # Make sure it is cached before new floors.
+
+        game_map = self.get_floor(floor)
+        self.current_floor = floor
+        self.highest_floor = max(self.highest_floor, floor)
+        self.engine.game_map = game_map
+        arrival = game_map.entry_location if going_up else game_map.upstairs_location
+        self.engine.player.place(*arrival, game_map)
+
+        if left_map is not None:
+            # Written once the player is off it, it won't change again until revisited.
+            self._unwritten_floors.add(left_floor)
+            if self.floor_dir:
+                self._write_floor(left_floor, left_map)
+        self._evict_floors()
+
+        self.prepare_next_floor()
+
+    @property
+    def floor_directory(self) -> str:
+        """The directory floors are written to: `floor_dir`, or a temporary one."""
+        if self.floor_dir:
+            return self.floor_dir
+        if self._temp_floor_dir is None:
+            self._temp_floor_dir = tempfile.mkdtemp(prefix="tommy-floors-")
+            weakref.finalize(self, shutil.rmtree, self._temp_floor_dir, ignore_errors=True)
+        return self._temp_floor_dir
+
+    def floor_path(self, floor: int) -> str:
+        return os.path.join(self.floor_directory, f"floor{floor}.sav")
+
+    def _write_floor(self, floor: int, game_map: GameMap) -> None:
+        from savefile import save_floor
+
+        os.makedirs(self.floor_directory, exist_ok=True)
+        save_floor(game_map, self.floor_path(floor))
+        self._unwritten_floors.discard(floor)
+
+    def _evict_floors(self) -> None:
+        # Drop the least recently used floors from memory, writing the ones not on disk yet.
+        while len(self._floor_cache) > self.max_cached_floors:
+            floor, game_map = self._floor_cache.popitem(last=False)
+            if floor in self._unwritten_floors:
+                self._write_floor(floor, game_map)
+            self.cache_evictions += 1
+
+    def get_floor(self, floor: int) -> GameMap:
+        """Return the map of a floor from memory, from disk, or by building it."""
+        game_map = self._floor_cache.pop(floor, None)
+        if game_map is not None:
+            self.cache_hits += 1
+        elif floor <= self.highest_floor:
+            self.cache_misses += 1
+            if (self.floor_dir or self._temp_floor_dir) and os.path.exists(self.floor_path(floor)):
+                from savefile import load_floor
 
-        self.current_floor += 1
+                game_map = load_floor(self.engine, self.floor_path(floor))
+            else:  # Never written, so start it afresh.
+                game_map = self.build_floor(floor)
+        else:  # A new floor, prefer the pre-built one when available.
+            game_map = self._take_pending_floor(floor)
+            if game_map is None:
+                game_map = self.build_floor(floor)
 
-        self.engine.game_map = generate_dungeon(
+        self._floor_cache[floor] = game_map  # Now the most recently used, see _evict_floors.
+        return game_map
+
+    @property
+    def cache_stats(self) -> Dict[str, Any]:
+        """Floor cache counters, and the floors in memory with their total size in bytes."""
+        return {
+            "hits": self.cache_hits,
+            "misses": self.cache_misses,
+            "evictions": self.cache_evictions,
+            "floors": list(self._floor_cache),
+            "nbytes": sum(game_map.nbytes for game_map in self._floor_cache.values()),
+        }
+
+    def prepare_next_floor(self) -> None:
+        """Start building the floor above the current one on the floor builder thread."""
+        floor = self.current_floor + 1
+        if floor <= self.highest_floor:
+            return  # Already visited, it will be loaded instead.
+        if self._pending_floor is not None and self._pending_floor[0] == floor:
+            return
+        self._pending_floor = floor, floor_builder.submit(self.build_floor, floor)
+
+    def _take_pending_floor(self, floor: int) -> Optional[GameMap]:
+        # Return the pre-built floor, waiting for it if it is still being built.
+        if self._pending_floor is None:
+            return None
+        pending_floor, future = self._pending_floor
+        self._pending_floor = None
+        if pending_floor != floor or future.cancel():
+            return None  # Wrong floor, or never started: the caller builds it directly.
+        return future.result()
+
+    def build_floor(self, floor: int) -> GameMap:
+        """Generate the given floor without touching the current game state."""
+        if self.open_world_size:
+            return self.build_open_floor(floor)
+
+        from procgen import generate_dungeon
+
+        return generate_dungeon(
             max_rooms=self.max_rooms,
             room_min_size=self.room_min_size,
             room_max_size=self.room_max_size,
@@ -129,5 +823,27 @@ class GameWorld:
             map_height=self.map_height,
             max_monsters_per_room=self.max_monsters_per_room,
             max_items_per_room=self.max_items_per_room,
-            engine=self.engine
-        )
\ No newline at end of file
+            engine=self.engine,
+            rng=self.floor_rng(floor),
+            down_stairs=floor > 1,
+        )
+
+    def build_open_floor(self, floor: int) -> GameMap:
+        """Create an open floor stored in chunks, which are generated as the player explores."""
+        from chunked_map import ChunkedGameMap
+
+        size = self.open_world_size
+        rng = self.floor_rng(floor)
+        game_map = ChunkedGameMap(
+            self.engine,
+            size,
+            size,
+            seed=(self.seed, floor),
+            max_monsters_per_chunk=self.max_monsters_per_room,
+            max_items_per_chunk=self.max_items_per_room,
+        )
+        game_map.entry_location = size // 2, size // 2
+        game_map.upstairs_location = int(rng.integers(size)), int(rng.integers(size))
+        if floor > 1:
+            game_map.downstairs_location = game_map.entry_location
+        return game_map
@@ -6,9 +6,12 @@ import tcod.event
 
 import actions
 import os
+import shutil
 from actions import Action, BumpAction, WaitAction, PickUpAction
 import color
 import exceptions
+import profiler
+from engine import VIEW_HEIGHT, VIEW_WIDTH
 
 if TYPE_CHECKING:
     from engine import Engine
@@ -104,19 +107,26 @@ class EventHandler(BaseEventHandler):
             return False
         
         try:
-            action.perform();
+            with profiler.timed("action", type(action).__name__):
+                action.perform();
         except exceptions.Impossible as exc:
             self.engine.message_log.add_message(exc.args[0], color.impossible)
             # Skip turn on exceptions
         
-        self.engine.handle_enemy_turns()
-        self.engine.update_fov()
+        with profiler.timed("phase", "enemy_turns"):
+            self.engine.handle_enemy_turns()
+        with profiler.timed("phase", "update_fov"):
+            self.engine.update_fov()
+        if self.engine.autosaver:
+            with profiler.timed("phase", "autosave"):
+                self.engine.autosaver.turn_finished(self.engine)
         return True
 
 
     def ev_mousemotion(self, event: tcod.event.MouseMotion) ->  None:
-        if self.engine.game_map.in_bounds(event.tile.x, event.tile.y):
-            self.engine.mouse_location = event.tile.x, event.tile.y
+        x, y = self.engine.screen_to_map(event.tile.x, event.tile.y)
+        if self.engine.game_map.in_bounds(x, y):
+            self.engine.mouse_location = x, y
 
     def on_render(self, console: tcod.Console) -> None:
         self.engine.render(console)
@@ -357,7 +367,7 @@ class SelectIndexHandler(AskUserEventHandler):
     def on_render(self, console: tcod.Console) -> None:
         """Highlight the tile under the cursor."""
         super().on_render(console)
-        x, y = self.engine.mouse_location
+        x, y = self.engine.map_to_screen(*self.engine.mouse_location)
         console.tiles_rgb["bg"][x, y] = color.white
         console.tiles_rgb["fg"][x, y] = color.black
         
@@ -378,9 +388,12 @@ class SelectIndexHandler(AskUserEventHandler):
             dx, dy = MOVE_KEYS[key]
             x += dx * modifier
             y += dy * modifier
-            # Clamp the cursor index to the map size.
-            x = max(0, min(x, self.engine.game_map.width - 1))
-            y = max(0, min(y, self.engine.game_map.height - 1))
+            # Clamp the cursor index to the part of the map on screen.
+            left, top = self.engine.camera
+            right = min(left + VIEW_WIDTH, self.engine.game_map.width)
+            bottom = min(top + VIEW_HEIGHT, self.engine.game_map.height)
+            x = max(left, min(x, right - 1))
+            y = max(top, min(y, bottom - 1))
             self.engine.mouse_location = x, y
             return None
         elif key in CONFIRM_KEYS:
@@ -389,9 +402,10 @@ class SelectIndexHandler(AskUserEventHandler):
     
     def ev_mousebuttondown(self, event: tcod.event.MouseButtonDown) -> Optional[ActionOrHandler]:
         # Left click confirms a selection
-        if self.engine.game_map.in_bounds(*event.tile):
+        x, y = self.engine.screen_to_map(*event.tile)
+        if self.engine.game_map.in_bounds(x, y):
             if event.button == 1:
-                return self.on_index_selected(*event.tile)
+                return self.on_index_selected(x, y)
         return super().ev_mousebuttondown(event)
     
     def on_index_selected(self, x: int, y: int) -> Optional[ActionOrHandler]:
@@ -433,7 +447,7 @@ class AreaRangedAttackHandler(SelectIndexHandler):
         """Highlight the tile under the cursor."""
         super().on_render(console)
 
-        x, y = self.engine.mouse_location
+        x, y = self.engine.map_to_screen(*self.engine.mouse_location)
 
         # Draw a rectangle around the targeted area, so the player can see the affected tiles.
         console.draw_frame(
@@ -448,6 +462,40 @@ class AreaRangedAttackHandler(SelectIndexHandler):
     def on_index_selected(self, x: int, y: int) -> Optional[Action]:
         return self.callback((x, y))
 
+class ProfileViewer(AskUserEventHandler):
+    """Shows the floor cache counters and the ones collected by the profiler, see profiler.py."""
+
+    TITLE = "Profile (name, calls, mean, max)"
+
+    def on_render(self, console: tcod.Console) -> None:
+        super().on_render(console)
+
+        if profiler.enabled:
+            lines = profiler.summary_lines() or ["Nothing recorded yet."]
+        else:
+            lines = ["Profiling is off.", "Set TOMMY_PROFILE to a file name to turn it on."]
+        stats = self.engine.game_world.cache_stats
+        lines = [
+            f"Floor cache: {stats['hits']} hits, {stats['misses']} misses, {stats['evictions']} evictions",
+            f"Floors {stats['floors']} in memory, {stats['nbytes']} bytes",
+            *lines,
+        ]
+        lines = lines[: console.height - 4]
+        width = max(len(self.TITLE), *(len(line) for line in lines)) + 4
+
+        console.draw_frame(
+            x=0,
+            y=0,
+            width=width,
+            height=len(lines) + 2,
+            title=self.TITLE,
+            clear=True,
+            fg=(255, 255, 255),
+            bg=(0, 0, 0),
+        )
+        for i, line in enumerate(lines):
+            console.print(x=1, y=i + 1, string=line)
+
 class MainGameEventHandler(EventHandler):
 
     def ev_keydown(self, event: tcod.event.KeyDown) -> Optional[ActionOrHandler]:
@@ -458,9 +506,10 @@ class MainGameEventHandler(EventHandler):
 
         player = self.engine.player
 
-        if key == tcod.event.K_PERIOD and modifier & (
+        if key in (tcod.event.K_PERIOD, tcod.event.K_COMMA) and modifier & (
             tcod.event.KMOD_LSHIFT | tcod.event.KMOD_RSHIFT
         ):
+            # '>' or '<', whichever stairs the player is standing on.
             return actions.TakeStairsAction(player)
         
         if key in MOVE_KEYS:
@@ -483,6 +532,8 @@ class MainGameEventHandler(EventHandler):
             return CharacterScreenEventHandler(self.engine)
         elif key == tcod.event.K_SLASH:
             return LookHandler(self.engine)
+        elif key == tcod.event.K_F3:
+            return ProfileViewer(self.engine)
         
         # No valid key was pressed
         return action
@@ -490,8 +541,17 @@ class MainGameEventHandler(EventHandler):
 class GameOverEventHandler(EventHandler):
     def on_quit(self) -> None:
         #Handle exiting out of a finished game.
+        if self.engine.autosaver:
+            self.engine.autosaver.close()  # So no autosave is written after the file is gone.
         if os.path.exists("savegame.sav"):
             os.remove("savegame.sav")  # Deletes the active save file.
+        if self.engine.game_world.floor_dir:
+            shutil.rmtree(self.engine.game_world.floor_dir, ignore_errors=True)
+        history_path = self.engine.message_log.history_path
+        if history_path:
+            self.engine.message_log.close()
+            if os.path.exists(history_path):
+                os.remove(history_path)  # The finished game's older messages.
         raise exceptions.QuitWithoutSaving()  # Avoid saving a finished game.
 
     def ev_quit(self, event: tcod.event.Quit) -> None:
@@ -514,7 +574,9 @@ class HistoryViewer(EventHandler):
 
     def __init__(self, engine: Engine):
         super().__init__(engine)
-        self.log_length = len(engine.message_log.messages)
+        # Indexes into the whole log, only the page being shown is ever loaded.
+        self.first_message = engine.message_log.oldest_index
+        self.log_length = len(engine.message_log)
         self.cursor = self.log_length - 1
 
     def on_render(self, console: tcod.Console) -> None:
@@ -529,13 +591,15 @@ class HistoryViewer(EventHandler):
         )
 
         # Render the message log using the cursor parameter.
+        # Every message takes at least one line, so no more than a screenful is needed.
+        page_height = log_console.height - 2
         self.engine.message_log.render_messages(
             log_console,
             1,
             1,
             log_console.width - 2,
-            log_console.height - 2,
-            self.engine.message_log.messages[: self.cursor + 1],
+            page_height,
+            self.engine.message_log.get_messages(self.cursor + 1 - page_height, self.cursor + 1),
         )
         log_console.blit(console, 3, 3)
 
@@ -543,17 +607,17 @@ class HistoryViewer(EventHandler):
         # Fancy conditional movement to make it feel right.
         if event.sym in CURSOR_Y_KEYS:
             adjust = CURSOR_Y_KEYS[event.sym]
-            if adjust < 0 and self.cursor == 0:
+            if adjust < 0 and self.cursor == self.first_message:
                 # Only move from the top to the bottom when you're on the edge.
                 self.cursor = self.log_length - 1
             elif adjust > 0 and self.cursor == self.log_length - 1:
                 # Same with bottom to top movement.
-                self.cursor = 0
+                self.cursor = self.first_message
             else:
                 # Otherwise move while staying clamped to the bounds of the history log.
-                self.cursor = max(0, min(self.cursor + adjust, self.log_length - 1))
+                self.cursor = max(self.first_message, min(self.cursor + adjust, self.log_length - 1))
         elif event.sym == tcod.event.K_HOME:
-            self.cursor = 0  # Move directly to the top message.
+            self.cursor = self.first_message  # Move directly to the top message.
         elif event.sym == tcod.event.K_END:
             self.cursor = self.log_length - 1  # Move directly to the last message.
         else:  # Any other key moves back to the main game state.
@@ -5,12 +5,16 @@ import tcod
 
 import exceptions
 import input_handlers
+import profiler
 import color
 import setup_game
 
 def save_game(handler: input_handlers.BaseEventHandler, filename: str) -> None:
     #If the current event handler has an active Engine then save it.
     if isinstance(handler, input_handlers.EventHandler):
+        autosaver = handler.engine.autosaver
+        if autosaver:
+            autosaver.close()  # Finish any autosave first, so it can't replace this save.
         handler.engine.save_as(filename)
         print("Game saved.")
 
@@ -35,13 +39,16 @@ def main() -> None:
         try:
          while True:
             root_console.clear()
-            handler.on_render(console=root_console)
-            context.present(root_console)
+            with profiler.timed("phase", "render"):
+                handler.on_render(console=root_console)
+            with profiler.timed("phase", "present"):
+                context.present(root_console)
 
             try:
              for event in tcod.event.wait():
                 context.convert_event(event)
-                handler = handler.handle_events(event)
+                with profiler.timed("phase", "handle_events"):
+                    handler = handler.handle_events(event)
             except Exception:  # Handle exceptions in game.
                  traceback.print_exc()  # Print error to stderr.
                     # Then print the error to the message log.
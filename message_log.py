@@ -1,16 +1,33 @@
-from typing import List, Reversible, Tuple, Iterable
+from array import array
+from collections import deque
+from typing import BinaryIO, Deque, List, Optional, Reversible, Tuple, Iterable
+import json
 import textwrap
 
 import tcod
 
 import color
+from slotted import Slotted
+
+class Message(Slotted):
+    __slots__ = ("plain_text", "fg", "count", "_wrapped")
 
-class Message:
     def __init__(self, text: str, fg: Tuple[int, int, int]):
         self.plain_text = text
         self.fg = fg
         self.count = 1
-    
+        # (width, count, lines) of the last wrap() call.
+        self._wrapped: Optional[Tuple[int, int, List[str]]] = None
+
+    def __getstate__(self) -> dict:
+        state = super().__getstate__()
+        state.pop("_wrapped", None)
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        super().__setstate__(state)
+        self._wrapped = None
+
     @property
     def full_text(self) -> str:
         # Full text of this message, including the count if necessary
@@ -18,10 +35,58 @@ class Message:
             return f"{self.plain_text} (x{self.count})"
         return self.plain_text
 
+    def wrap(self, width: int) -> List[str]:
+        """Return the full text wrapped to `width`, cached until the width or count changes."""
+        if self._wrapped is None or self._wrapped[:2] != (width, self.count):
+            self._wrapped = (width, self.count, list(MessageLog.wrap(self.full_text, width)))
+        return self._wrapped[2]
+
 class MessageLog:
-    def __init__(self) -> None:
-        self.messages: List[Message] = []
-    
+    """A log which keeps at most `capacity` recent messages in memory.
+
+    Older messages are written to `history_path`, one JSON record per line, and read back
+    on demand.  Without a history file they are discarded.
+    """
+
+    def __init__(self, capacity: int = 1000, history_path: Optional[str] = None) -> None:
+        self.messages: Deque[Message] = deque()
+        self.capacity = capacity
+        self.history_path = history_path
+        # Index of messages[0] in the whole log, which is how many messages were pushed out.
+        self.first_index = 0
+        # Byte offset of every message written to the history file.
+        self._history_offsets = array("q")
+        self._history_file: Optional[BinaryIO] = None
+        # Off-screen copy of the message panel, redrawn only after the log changes.
+        self._panel: Optional[tcod.Console] = None
+        self._panel_dirty = True
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state["_history_file"] = None
+        state["_panel"] = None
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        state["messages"] = deque(state["messages"])  # Older saves used a list.
+        state.setdefault("capacity", 1000)
+        state.setdefault("history_path", None)
+        state.setdefault("first_index", 0)
+        state.setdefault("_history_offsets", array("q"))
+        state["_history_file"] = None
+        state["_panel"] = None
+        state["_panel_dirty"] = True
+        self.__dict__.update(state)
+
+    def __len__(self) -> int:
+        # Number of messages ever logged.
+        return self.first_index + len(self.messages)
+
+    @property
+    def oldest_index(self) -> int:
+        """Index of the oldest message which can still be read back."""
+        return 0 if self.history_path else self.first_index
+
     def add_message(
             self, text: str, fg: Tuple[int, int, int] = color.white, *, stack: bool = True
     ) -> None:
@@ -32,11 +97,64 @@ class MessageLog:
             self.messages[-1].count += 1
        else:
             self.messages.append(Message(text, fg))
-    
+            while len(self.messages) > self.capacity:
+                self._push_out(self.messages.popleft())
+       self._panel_dirty = True
+
+    def _push_out(self, message: Message) -> None:
+        # Move the oldest message out of memory, into the history file if there is one.
+        if self.history_path:
+            history = self._open_history()
+            history.seek(0, 2)
+            self._history_offsets.append(history.tell())
+            record = [message.plain_text, list(message.fg), message.count]
+            history.write(json.dumps(record).encode("utf-8") + b"\n")
+            history.flush()
+        self.first_index += 1
+
+    def _open_history(self) -> BinaryIO:
+        if self._history_file is None:
+            assert self.history_path
+            # A new log starts a new file, a loaded log appends to the one it was using.
+            mode = "a+b" if self._history_offsets else "w+b"
+            self._history_file = open(self.history_path, mode)
+        return self._history_file
+
+    def close(self) -> None:
+        """Close the history file, it is opened again when next needed."""
+        if self._history_file is not None:
+            self._history_file.close()
+            self._history_file = None
+
+    def _read_history(self, index: int) -> Message:
+        history = self._open_history()
+        history.seek(self._history_offsets[index])
+        text, fg, count = json.loads(history.readline().decode("utf-8"))
+        message = Message(text, tuple(fg))
+        message.count = count
+        return message
+
+    def get_messages(self, start: int, stop: int) -> List[Message]:
+        """Return the messages from index `start` up to `stop`, reading old ones from disk."""
+        start = max(start, self.oldest_index)
+        stop = min(stop, len(self))
+        messages = [self._read_history(index) for index in range(start, min(stop, self.first_index))]
+        for index in range(max(start, self.first_index), stop):
+            messages.append(self.messages[index - self.first_index])
+        return messages
+
     def render(self, console: tcod.Console, x: int, y: int, width: int, height: int) -> None:
         # Renders the log over the given area, using x and y as positioning coordinates
-        self.render_messages(console, x, y, width, height, self.messages)
-    
+        panel = self._panel
+        if panel is None or (panel.width, panel.height) != (width, height):
+            panel = self._panel = tcod.Console(width, height, order="F")
+            self._panel_dirty = True
+        if self._panel_dirty:
+            panel.clear()
+            self.render_messages(panel, 0, 0, width, height, self.messages)
+            self._panel_dirty = False
+        panel.blit(console, x, y)
+
     @staticmethod
     def wrap(string: str, width: int) -> Iterable[str]:
         """Return a wrapped text message."""
@@ -44,15 +162,15 @@ class MessageLog:
             yield from textwrap.wrap(
                 line, width, expand_tabs=True,
             )
-    
+
     @classmethod
     def render_messages(cls, console: tcod.Console, x: int, y: int, width: int, height: int, messages: Reversible[Message],) -> None:
         # Render messages provided, starting at the last message and working backwards
         y_offset = height - 1
 
         for message in reversed(messages):
-            for line in reversed(list(cls.wrap(message.full_text, width))):
+            for line in reversed(message.wrap(width)):
                 console.print(x=x, y=y + y_offset, string=line, fg=message.fg)
                 y_offset -= 1
                 if y_offset < 0:
-                    return  # No more space to print messages.
\ No newline at end of file
+                    return  # No more space to print messages.
@@ -1,9 +1,8 @@
 from __future__ import annotations
 
 from typing import Tuple, Iterator, List, TYPE_CHECKING
-import random
 
-import tcod
+import numpy as np
 
 import entity_factories
 from game_map import GameMap
@@ -41,27 +40,27 @@ class RectangularRoom:
         )
     
 def place_entities(
-            room: RectangularRoom, dungeon: GameMap, maximum_monsters: int, maximum_items: int,
+            room: RectangularRoom, dungeon: GameMap, maximum_monsters: int, maximum_items: int, rng: np.random.Generator,
     ) -> None:
-            number_of_monsters = random.randint(0, maximum_monsters)
-            number_of_items = random.randint(0, maximum_items)
+            number_of_monsters = int(rng.integers(0, maximum_monsters, endpoint=True))
+            number_of_items = int(rng.integers(0, maximum_items, endpoint=True))
 
             for i in range(number_of_monsters):
-                x = random.randint(room.x1 + 1, room.x2 - 1)
-                y = random.randint(room.y1 + 1, room.y2 - 1)
+                x = int(rng.integers(room.x1 + 1, room.x2 - 1, endpoint=True))
+                y = int(rng.integers(room.y1 + 1, room.y2 - 1, endpoint=True))
 
-                if not any (entity.x == x and entity.y == y for entity in dungeon.entities):
-                    if random.random() < 0.8:
+                if not dungeon.get_entities_at(x, y) and (x, y) != dungeon.entry_location and dungeon.is_walkable(x, y):
+                    if rng.random() < 0.8:
                         entity_factories.bot.spawn(dungeon, x, y)
                     else:
                         entity_factories.employee.spawn(dungeon, x, y)
 
             for i in range(number_of_items):
-                x = random.randint(room.x1 + 1, room.x2 - 1)
-                y = random.randint(room.y1 + 1, room.y2 - 1)
+                x = int(rng.integers(room.x1 + 1, room.x2 - 1, endpoint=True))
+                y = int(rng.integers(room.y1 + 1, room.y2 - 1, endpoint=True))
 
-                if not any(entity.x == x and entity.y == y for entity in dungeon.entities):
-                    item_chance = random.random()
+                if not dungeon.get_entities_at(x, y) and (x, y) != dungeon.entry_location and dungeon.is_walkable(x, y):
+                    item_chance = rng.random()
 
                     if item_chance < 0.7:
                         entity_factories.bandage.spawn(dungeon, x, y)
@@ -72,65 +71,75 @@ def place_entities(
                     else:
                         entity_factories.onetimehack.spawn(dungeon, x, y)
     
-def tunnel_between(start: Tuple[int, int], end: Tuple[int, int]) -> Iterator[Tuple[int, int]]:
-    # Return an L-shaped tunnel between two rooms
+def tunnel_between(start: Tuple[int, int], end: Tuple[int, int], horizontal_first: bool) -> Iterator[Tuple[slice, slice]]:
+    # Return an L-shaped tunnel between two rooms as the 2d array indexes of its two straight legs
     x1, y1 = start
     x2, y2 = end
-    if random.random() < 0.5:
+    if horizontal_first:
         # Moves horizontally, then vertically
         corner_x, corner_y = x2, y1
     else:
         # Moves vertically then horizontally
         corner_x, corner_y = x1, y2
 
-    # Generate the coordinates for this tunnel.
-    for x, y in tcod.los.bresenham((x1, y1), (corner_x, corner_y)).tolist():
-        yield x, y
-    for x, y in tcod.los.bresenham((corner_x, corner_y), (x2, y2)).tolist():
-        yield x, y
+    yield slice(min(x1, corner_x), max(x1, corner_x) + 1), slice(min(y1, corner_y), max(y1, corner_y) + 1)
+    yield slice(min(corner_x, x2), max(corner_x, x2) + 1), slice(min(corner_y, y2), max(corner_y, y2) + 1)
 
-def generate_dungeon(max_rooms: int, room_min_size: int, room_max_size: int, map_width: int, map_height: int, max_monsters_per_room: int, max_items_per_room: int, engine: Engine) -> GameMap:
-    #Generate a new dungeon map
-    player = engine.player
-    dungeon = GameMap(engine, map_width, map_height, entities=[player])
+def generate_dungeon(max_rooms: int, room_min_size: int, room_max_size: int, map_width: int, map_height: int, max_monsters_per_room: int, max_items_per_room: int, engine: Engine, rng: np.random.Generator, down_stairs: bool = False) -> GameMap:
+    #Generate a new dungeon map, drawing every random choice from `rng`
+    # The player isn't touched here so that floors can be built on another thread.
+    dungeon = GameMap(engine, map_width, map_height)
 
     rooms: List[RectangularRoom] = []
 
     center_of_last_room = (0,0)
 
-    for r in range(max_rooms):
-        room_width = random.randint(room_min_size, room_max_size)
-        room_height = random.randint(room_min_size, room_max_size)
+    # Sample every candidate room up front instead of one at a time.
+    room_sizes = rng.integers(room_min_size, room_max_size, size=(max_rooms, 2), endpoint=True)
+    room_xs = rng.integers(0, map_width - room_sizes[:, 0] - 1, endpoint=True)
+    room_ys = rng.integers(0, map_height - room_sizes[:, 1] - 1, endpoint=True)
+    horizontal_first = rng.random(max_rooms) < 0.5
 
-        x = random.randint(0, dungeon.width - room_width - 1)
-        y = random.randint(0, dungeon.height - room_height - 1)
+    # Tiles covered by accepted rooms, walls included, so an overlap test is a single slice
+    # lookup no matter how many rooms have been placed.
+    occupied = np.zeros((map_width, map_height), dtype=bool, order="F")
 
+    for r in range(max_rooms):
         # "RectangularRoom" class makes rectangles easier to work with
-        new_room = RectangularRoom(x, y, room_width, room_height)
+        new_room = RectangularRoom(int(room_xs[r]), int(room_ys[r]), int(room_sizes[r, 0]), int(room_sizes[r, 1]))
+        outer = slice(new_room.x1, new_room.x2 + 1), slice(new_room.y1, new_room.y2 + 1)
 
-        # Run through the other rooms and see if they intersect with this one
-        if any(new_room.intersects(other_room) for other_room in rooms):
+        # Check if this room intersects any of the other rooms
+        if occupied[outer].any():
             continue  # Intersects, so we try again
+        occupied[outer] = True
 
         # Dig out this rooms inner area
         dungeon.tiles[new_room.inner] = tile_types.floor
 
         if len(rooms) == 0:
             # The first room, where the player starts
-            player.place(*new_room.center, dungeon)
+            dungeon.entry_location = new_room.center
         else:  # All rooms after the first.
             # Dig out a tunnel between this room and the previous one.
-            for x, y in tunnel_between(rooms[-1].center, new_room.center):
-                dungeon.tiles[x, y] = tile_types.floor
+            for leg in tunnel_between(rooms[-1].center, new_room.center, bool(horizontal_first[r])):
+                dungeon.tiles[leg] = tile_types.floor
 
             center_of_last_room = new_room.center
 
-        place_entities(new_room, dungeon, max_monsters_per_room, max_items_per_room)
+        place_entities(new_room, dungeon, max_monsters_per_room, max_items_per_room, rng)
 
-        dungeon.tiles[center_of_last_room] = tile_types.up_stairs
-        dungeon.upstairs_location = center_of_last_room
- 
         # Finally, append the new room to the list
         rooms.append(new_room)
 
+    dungeon.tiles[center_of_last_room] = tile_types.up_stairs
+    dungeon.upstairs_location = center_of_last_room
+
+    if down_stairs:
+        # Back down to the floor below, where the player arrives.
+        dungeon.tiles[dungeon.entry_location] = tile_types.down_stairs
+        dungeon.downstairs_location = dungeon.entry_location
+
+    dungeon.mark_tiles_changed()
+
     return dungeon
\ No newline at end of file
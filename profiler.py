@@ -0,0 +1,147 @@
+"""Timings and counters for the turn and frame loop.
+
+Profiling is off unless the TOMMY_PROFILE environment variable is set, to the JSON file the
+results are written to when the game exits.  While it is off `timed` returns a shared
+context manager which does nothing and `count` returns straight away, so instrumented code
+only pays for a function call.
+
+Timings are grouped: "phase" for the parts of a turn or frame, "action" per Action class
+and "ai" per AI class.  Counters count events such as pathfinder builds and FOV recomputes.
+"""
+from __future__ import annotations
+
+import atexit
+import json
+import os
+import time
+from typing import Any, ContextManager, Dict, List, Optional
+
+enabled = False
+output_path: Optional[str] = None
+
+
+class Timing:
+    __slots__ = ("calls", "seconds", "max_seconds")
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+
+    def add(self, seconds: float) -> None:
+        self.calls += 1
+        self.seconds += seconds
+        if seconds > self.max_seconds:
+            self.max_seconds = seconds
+
+
+# Timings by group then name, and counters by name.
+timings: Dict[str, Dict[str, Timing]] = {}
+counters: Dict[str, int] = {}
+
+
+class _Timer:
+    __slots__ = ("timing", "start")
+
+    def __init__(self, timing: Timing):
+        self.timing = timing
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.timing.add(time.perf_counter() - self.start)
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        pass
+
+    def __exit__(self, *exc_info: Any) -> None:
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def timed(group: str, name: str) -> ContextManager[None]:
+    """Return a context manager which adds the time spent in it to the named timing."""
+    if not enabled:
+        return _NULL_TIMER
+    group_timings = timings.setdefault(group, {})
+    timing = group_timings.get(name)
+    if timing is None:
+        timing = group_timings[name] = Timing()
+    return _Timer(timing)
+
+
+def count(name: str, amount: int = 1) -> None:
+    """Add to the named counter."""
+    if enabled:
+        counters[name] = counters.get(name, 0) + amount
+
+
+def enable(path: Optional[str] = None) -> None:
+    """Start profiling, and write the results to `path` at exit if it is given."""
+    global enabled, output_path
+    enabled = True
+    if path and output_path is None:
+        atexit.register(_dump_at_exit)
+    output_path = path or output_path
+
+
+def reset() -> None:
+    timings.clear()
+    counters.clear()
+
+
+def report() -> Dict[str, Any]:
+    """Return the timings and counters so far, as JSON-compatible data."""
+    return {
+        "timings": {
+            group: {
+                name: {
+                    "calls": timing.calls,
+                    "total_ms": timing.seconds * 1000,
+                    "mean_ms": timing.seconds / max(1, timing.calls) * 1000,
+                    "max_ms": timing.max_seconds * 1000,
+                }
+                for name, timing in group_timings.items()
+            }
+            for group, group_timings in timings.items()
+        },
+        "counters": dict(counters),
+    }
+
+
+def summary_lines() -> List[str]:
+    """Return the timings, slowest in total first, then the counters, as lines of text."""
+    rows = [
+        (timing.seconds, f"{group}:{name}", timing)
+        for group, group_timings in timings.items()
+        for name, timing in group_timings.items()
+    ]
+    rows.sort(key=lambda row: row[0], reverse=True)
+    lines = [
+        f"{label:<28}{timing.calls:>8}{timing.seconds / max(1, timing.calls) * 1000:>9.3f}ms"
+        f"{timing.max_seconds * 1000:>9.3f}ms"
+        for _, label, timing in rows
+    ]
+    lines += [f"{name:<28}{value:>8}" for name, value in sorted(counters.items())]
+    return lines
+
+
+def dump(path: str) -> None:
+    with open(path, "w") as f:
+        json.dump(report(), f, indent=2)
+
+
+def _dump_at_exit() -> None:
+    if output_path:
+        dump(output_path)
+
+
+if os.environ.get("TOMMY_PROFILE"):
+    enable(os.environ["TOMMY_PROFILE"])
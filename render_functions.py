@@ -10,11 +10,11 @@ if TYPE_CHECKING:
     from game_map import GameMap
 
 def get_names_at(x: int, y: int, game_map: GameMap) -> str:
-    if not game_map.in_bounds(x, y) or not game_map.visible[x, y]:
+    if not game_map.in_bounds(x, y) or not game_map.is_visible(x, y):
         return ""
     
     names = ", ".join(
-        entity.name for entity in game_map.entities if entity.x == x and entity.y == y
+        entity.name for entity in game_map.get_entities_at(x, y)
     )
 
     return names.capitalize()
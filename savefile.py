@@ -0,0 +1,645 @@
+"""Versioned binary save files.
+
+A save file is the magic bytes and a format version, followed by a list of sections.
+Every section has a header giving its name, codec and sizes, then its (possibly
+compressed) payload:
+
+    META  JSON: format details, the GameWorld settings and RNG state, map metadata.
+    TILE  GameMap.tiles as a raw array buffer.
+    VISI  GameMap.visible as a raw array buffer.
+    EXPL  GameMap.explored as a raw array buffer.
+    ENTS  JSON lines: one compact record per entity on the map, inventories nested.
+    MLOG  JSON lines: the message log settings, then one record per message.
+
+A map stored in chunks (see chunked_map.py) has no TILE, VISI and EXPL sections.  Every
+chunk is saved packed, with the entities on it, and ENTS only holds the other entities:
+
+    CHNK  JSON lines: the position and packed sizes of each chunk.
+    CDAT  The packed chunks one after the other, stored as they are.
+
+Payloads are compressed and written in chunks, and records are encoded a batch at a
+time as they are written, so a save never holds a second full copy of the game in
+memory.  Sections are written by `write_snapshot` from the data gathered by `snapshot`.
+
+Format versions:
+
+    1  ENTS is a JSON list of records and MLOG a single JSON object.
+    2  ENTS and MLOG are JSON lines.
+
+Files of either version can be loaded, other versions are rejected.
+
+A floor file, written by `save_floor` for a floor the player has left, has the same
+layout without the MLOG section and with only the map metadata in META.
+
+The map arrays of large maps are stored uncompressed.  Loading maps them from the file
+with `np.memmap` (copy-on-write), so only the entity and metadata sections are parsed
+up front and tile data is paged in as it is used.
+"""
+from __future__ import annotations
+
+import bz2
+import json
+import lzma
+import os
+import struct
+import zlib
+from array import array
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+import numpy as np
+
+from components import ai as ai_module
+from components import consumable as consumable_module
+from components.ai import BaseAI
+from components.consumable import Consumable
+from components.fighter import Fighter
+from components.inventory import Inventory
+from components.level import Level
+from chunked_map import ChunkedGameMap, PackedChunk
+from Entity import Actor, Entity, Item
+from engine import Engine
+from exceptions import SaveFormatError
+from game_map import GameMap, GameWorld
+from message_log import Message, MessageLog
+from render_order import RenderOrder
+
+MAGIC = b"TOMMYSAV"
+VERSION = 2
+# The versions `load` and `load_floor` can read, see the module docstring.
+SUPPORTED_VERSIONS = (1, 2)
+
+FILE_HEADER = struct.Struct("<8sH")
+# Section name, codec id, size of the payload once decompressed, size as stored.
+SECTION_HEADER = struct.Struct("<4sBQQ")
+
+CHUNK_SIZE = 1 << 16
+
+CODECS = ("none", "zlib", "bz2", "lzma")
+DEFAULT_CODEC = "zlib"
+DEFAULT_LEVEL = 6
+
+# The map arrays, by section name.
+ARRAY_SECTIONS = {"TILE": "tiles", "VISI": "visible", "EXPL": "explored"}
+# Sections holding data which is compressed already, written without a codec.
+PACKED_SECTIONS = ("CDAT",)
+# Maps with at least this many tiles store their arrays uncompressed, to be memory-mapped.
+MMAP_MIN_TILES = 256 * 256
+
+# Raw bytes, an array, or encoded records as a sequence of byte strings.
+Payload = Union[bytes, np.ndarray, Iterable[bytes]]
+
+
+class SectionInfo(NamedTuple):
+    codec: str
+    raw_size: int
+    offset: int  # Position of the payload in the file.
+    stored_size: int
+
+
+def _compressor(codec: str, level: int) -> Any:
+    if codec == "zlib":
+        return zlib.compressobj(level)
+    if codec == "bz2":
+        return bz2.BZ2Compressor(max(1, level))
+    if codec == "lzma":
+        return lzma.LZMACompressor(preset=level)
+    return None
+
+
+def _decompressor(codec: str) -> Any:
+    if codec == "zlib":
+        return zlib.decompressobj()
+    if codec == "bz2":
+        return bz2.BZ2Decompressor()
+    if codec == "lzma":
+        return lzma.LZMADecompressor()
+    return None
+
+
+def _payload_chunks(payload: Payload) -> Iterator[Union[bytes, memoryview]]:
+    # A payload as pieces of bytes, arrays are viewed in place in Fortran order.
+    if isinstance(payload, (bytes, bytearray, np.ndarray)):
+        if isinstance(payload, np.ndarray):
+            payload = np.asfortranarray(payload).ravel(order="F").view(np.uint8)
+        data = memoryview(payload).cast("B")
+        for start in range(0, len(data), CHUNK_SIZE):
+            yield data[start : start + CHUNK_SIZE]
+    else:
+        yield from payload  # Encoded records, produced as they are written.
+
+
+def write_section(file: BinaryIO, name: str, payload: Payload, codec: str, level: int) -> None:
+    """Write one section, compressing its payload a chunk at a time."""
+    header_position = file.tell()
+    file.write(SECTION_HEADER.pack(name.encode("ascii"), 0, 0, 0))  # Filled in below.
+
+    compressor = _compressor(codec, level)
+    raw_size = 0
+    stored_size = 0
+    for chunk in _payload_chunks(payload):
+        raw_size += len(chunk)
+        if compressor is not None:
+            chunk = compressor.compress(chunk)
+        file.write(chunk)
+        stored_size += len(chunk)
+    if compressor is not None:
+        tail = compressor.flush()
+        file.write(tail)
+        stored_size += len(tail)
+
+    end_position = file.tell()
+    file.seek(header_position)
+    file.write(
+        SECTION_HEADER.pack(name.encode("ascii"), CODECS.index(codec), raw_size, stored_size)
+    )
+    file.seek(end_position)
+
+
+def read_directory(file: BinaryIO) -> Tuple[int, Dict[str, SectionInfo]]:
+    """Check the file header and return the format version and where each section is.
+
+    Payloads aren't read.  Versions other than SUPPORTED_VERSIONS are rejected.
+    """
+    header = file.read(FILE_HEADER.size)
+    if len(header) < FILE_HEADER.size:
+        raise SaveFormatError("Save file is truncated.")
+    magic, version = FILE_HEADER.unpack(header)
+    if magic != MAGIC:
+        raise SaveFormatError("Not a save file.")
+    if version > VERSION:
+        raise SaveFormatError(f"Save file version {version} is newer than this game.")
+    if version not in SUPPORTED_VERSIONS:
+        raise SaveFormatError(f"Unknown save file version {version}.")
+
+    sections = {}
+    while True:
+        header = file.read(SECTION_HEADER.size)
+        if not header:
+            return version, sections
+        if len(header) < SECTION_HEADER.size:
+            raise SaveFormatError("Save file is truncated.")
+        name, codec_id, raw_size, stored_size = SECTION_HEADER.unpack(header)
+        offset = file.tell()
+        sections[name.decode("ascii")] = SectionInfo(CODECS[codec_id], raw_size, offset, stored_size)
+        file.seek(offset + stored_size)
+
+
+def read_section(file: BinaryIO, section: SectionInfo) -> bytearray:
+    """Return the decompressed payload of a section."""
+    file.seek(section.offset)
+    if section.codec == "none":
+        data = bytearray(file.read(section.stored_size))
+    else:
+        decompressor = _decompressor(section.codec)
+        data = bytearray()
+        remaining = section.stored_size
+        while remaining:
+            chunk = file.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            data += decompressor.decompress(chunk)
+    if len(data) != section.raw_size:
+        raise SaveFormatError("Save file is truncated.")
+    return data
+
+
+def read_records(file: BinaryIO, section: SectionInfo) -> List[Any]:
+    """Return the JSON lines of a section, decoded."""
+    return [json.loads(line) for line in read_section(file, section).splitlines()]
+
+
+def is_save_file(filename: str) -> bool:
+    """Return True if the file starts with the save file magic bytes."""
+    with open(filename, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+# Records.  JSON has no tuples, so coordinates and colors come back as lists.
+
+def entity_record(entity: Entity) -> Dict[str, Any]:
+    """Return a JSON-compatible record of an entity, see `load_entity`."""
+    record: Dict[str, Any] = {
+        "x": entity.x,
+        "y": entity.y,
+        "char": entity.char,
+        "color": entity.color,
+        "name": entity.name,
+        "blocks": entity.blocks_movement,
+        "order": entity.render_order.name,
+    }
+    if isinstance(entity, Actor):
+        fighter = entity.fighter
+        level = entity.level
+        record["ai_cls"] = entity.ai_cls.__name__
+        record["ai"] = _ai_record(entity.ai)
+        record["fighter"] = [fighter.max_hp, fighter.hp, fighter.defense, fighter.power]
+        record["inventory"] = [entity.inventory.capacity, [entity_record(item) for item in entity.inventory.items]]
+        record["level"] = [level.current_level, level.current_xp, level.level_up_base, level.level_up_factor, level.xp_given]
+    elif isinstance(entity, Item):
+        state = entity.consumable.__getstate__()
+        state.pop("parent", None)
+        record["consumable"] = [type(entity.consumable).__name__, state]
+    return record
+
+
+def _ai_record(ai: Optional[BaseAI]) -> Optional[Dict[str, Any]]:
+    if ai is None:
+        return None
+    state = ai.__getstate__()
+    del state["entity"]
+    for key, value in state.items():
+        if isinstance(value, BaseAI):  # A ConfusedEnemy remembers the AI it replaced.
+            state[key] = _ai_record(value)
+    return {"type": type(ai).__name__, "state": state}
+
+
+def _lookup(module: Any, name: str, base: type) -> Any:
+    # Only classes from the component modules can be named by a save file.
+    cls = getattr(module, name, None)
+    if not (isinstance(cls, type) and issubclass(cls, base)):
+        raise SaveFormatError(f"Unknown class in save file: {name}")
+    return cls
+
+
+# AI attributes holding lists of (x, y) tuples, which come back from JSON as lists of lists.
+AI_POINT_LISTS = frozenset(["path"])
+
+
+def _load_ai(record: Optional[Dict[str, Any]], actor: Actor) -> Optional[BaseAI]:
+    if record is None:
+        return None
+    ai_cls = _lookup(ai_module, record["type"], BaseAI)
+    ai = ai_cls.__new__(ai_cls)
+    ai.entity = actor
+    for key, value in record["state"].items():
+        if isinstance(value, dict):
+            value = _load_ai(value, actor)
+        elif key in AI_POINT_LISTS:
+            value = [tuple(point) for point in value]
+        setattr(ai, key, value)
+    return ai
+
+
+def load_entity(record: Dict[str, Any]) -> Entity:
+    """Build a new entity, on no map, from a record made by `entity_record`."""
+    common = dict(x=record["x"], y=record["y"], char=record["char"], color=tuple(record["color"]), name=record["name"])
+    if "fighter" in record:
+        max_hp, hp, defense, power = record["fighter"]
+        fighter = Fighter(hp=max_hp, defense=defense, power=power)
+        fighter._hp = hp
+        capacity, items = record["inventory"]
+        inventory = Inventory(capacity)
+        for item_record in items:
+            item = load_entity(item_record)
+            item.parent = inventory
+            inventory.items.append(item)
+        current_level, current_xp, level_up_base, level_up_factor, xp_given = record["level"]
+        entity: Entity = Actor(
+            **common,
+            ai_cls=_lookup(ai_module, record["ai_cls"], BaseAI),
+            fighter=fighter,
+            inventory=inventory,
+            level=Level(current_level, current_xp, level_up_base, level_up_factor, xp_given),
+        )
+        entity.ai = _load_ai(record["ai"], entity)
+    elif "consumable" in record:
+        name, state = record["consumable"]
+        consumable_cls = _lookup(consumable_module, name, Consumable)
+        consumable = consumable_cls.__new__(consumable_cls)
+        consumable.__setstate__(state)
+        entity = Item(**common, consumable=consumable)
+    else:
+        entity = Entity(**common)
+    entity.blocks_movement = record["blocks"]
+    entity.render_order = RenderOrder[record["order"]]
+    return entity
+
+
+def _message_log_records(message_log: MessageLog) -> Iterator[Any]:
+    # The settings of the log, then each message in memory.
+    yield {
+        "capacity": message_log.capacity,
+        "history_path": message_log.history_path,
+        "first_index": message_log.first_index,
+        "history_offsets": message_log._history_offsets.tolist(),
+    }
+    for message in message_log.messages:
+        yield [message.plain_text, message.fg, message.count]
+
+
+def _load_message_log(records: List[Any]) -> MessageLog:
+    settings = records[0]
+    message_log = MessageLog(capacity=settings["capacity"], history_path=settings["history_path"])
+    message_log.first_index = settings["first_index"]
+    message_log._history_offsets = array("q", settings["history_offsets"])
+    for text, fg, count in records[1:]:
+        message = Message(text, tuple(fg))
+        message.count = count
+        message_log.messages.append(message)
+    return message_log
+
+
+def _json_bytes(value: Any) -> bytes:
+    return json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+
+def _json_lines(values: Iterable[Any]) -> Iterator[bytes]:
+    # Encode each value as a line of JSON, yielded in batches of about CHUNK_SIZE bytes.
+    batch: List[bytes] = []
+    size = 0
+    for value in values:
+        line = _json_bytes(value) + b"\n"
+        batch.append(line)
+        size += len(line)
+        if size >= CHUNK_SIZE:
+            yield b"".join(batch)
+            batch.clear()
+            size = 0
+    if batch:
+        yield b"".join(batch)
+
+
+def _records_payload(values: Iterable[Any], detached: bool) -> Payload:
+    # Records are encoded while the section is written, or straight away for a detached
+    # snapshot, which mustn't read the game once it has been returned.
+    lines = _json_lines(values)
+    return list(lines) if detached else lines
+
+
+def _map_record(game_map: GameMap) -> Dict[str, Any]:
+    record: Dict[str, Any] = {
+        "width": game_map.width,
+        "height": game_map.height,
+        "upstairs_location": game_map.upstairs_location,
+        "downstairs_location": game_map.downstairs_location,
+        "entry_location": game_map.entry_location,
+    }
+    if isinstance(game_map, ChunkedGameMap):
+        record["chunked"] = {
+            "seed": game_map.seed,
+            "max_monsters_per_chunk": game_map.max_monsters_per_chunk,
+            "max_items_per_chunk": game_map.max_items_per_chunk,
+            "wall_density": game_map.wall_density,
+        }
+        return record
+    # Where update_visible left visible tiles, so the next update only clears that part.
+    record["visible_window"] = [
+        game_map.visible_window[0].start,
+        game_map.visible_window[1].start,
+        game_map.visible_window[0].stop,
+        game_map.visible_window[1].stop,
+    ]
+    record["arrays"] = {
+        name: np.lib.format.dtype_to_descr(getattr(game_map, attribute).dtype)
+        for name, attribute in ARRAY_SECTIONS.items()
+    }
+    return record
+
+
+def _map_sections(game_map: GameMap, detached: bool) -> Tuple[List[Entity], List[Tuple[str, Payload]]]:
+    # The sections of a map, and the entities in its ENTS section.
+    sections: List[Tuple[str, Payload]] = []
+    if isinstance(game_map, ChunkedGameMap):
+        entities, chunks = game_map.packed_chunks()
+        index = ([*position, *sizes] for position, sizes, _ in chunks)
+        sections.append(("CHNK", _records_payload(index, detached)))
+        sections.append(("CDAT", _chunk_data(chunks)))
+    else:
+        entities = list(game_map.entities)
+        for name, attribute in ARRAY_SECTIONS.items():
+            array = getattr(game_map, attribute)
+            sections.append((name, np.array(array, order="F") if detached else array))
+    sections.append(("ENTS", _records_payload(map(entity_record, entities), detached)))
+    return entities, sections
+
+
+def _chunk_data(chunks: List[PackedChunk]) -> Iterator[bytes]:
+    # Evicted chunks are read from the map's spill file as they are written.
+    for _, _, read in chunks:
+        yield from read()
+
+
+def snapshot(engine: Engine, detached: bool = False) -> List[Tuple[str, Payload]]:
+    """Return the sections of a save of `engine`, as (name, payload) pairs.
+
+    Records are encoded as the sections are written and the map arrays are returned as
+    they are, so the sections must be written before the game goes on.  A `detached`
+    snapshot copies the arrays and encodes the records straight away instead, so that it
+    can be written while the game goes on.
+    """
+    game_map = engine.game_map
+    world = engine.game_world
+    entities, map_sections = _map_sections(game_map, detached)
+    meta = {
+        "world": {
+            "map_width": world.map_width,
+            "map_height": world.map_height,
+            "max_rooms": world.max_rooms,
+            "room_min_size": world.room_min_size,
+            "room_max_size": world.room_max_size,
+            "max_monsters_per_room": world.max_monsters_per_room,
+            "max_items_per_room": world.max_items_per_room,
+            "current_floor": world.current_floor,
+            "seed": world.seed,
+            "max_cached_floors": world.max_cached_floors,
+            "floor_dir": world.floor_dir,
+            "open_world_size": world.open_world_size,
+        },
+        "highest_floor": world.highest_floor,
+        "rng": world.rng.bit_generator.state,
+        "map": _map_record(game_map),
+        "player": entities.index(engine.player),
+    }
+    sections: List[Tuple[str, Payload]] = [("META", _json_bytes(meta))]
+    sections += map_sections
+    sections.append(("MLOG", _records_payload(_message_log_records(engine.message_log), detached)))
+    return sections
+
+
+def write_snapshot(
+    sections: List[Tuple[str, Payload]],
+    filename: str,
+    codec: str = DEFAULT_CODEC,
+    level: int = DEFAULT_LEVEL,
+    array_codec: Optional[str] = None,
+) -> None:
+    """Write the sections returned by `snapshot` to a save file.
+
+    The map arrays use `array_codec`.  By default that is "none" for maps of at least
+    MMAP_MIN_TILES tiles, so they can be memory-mapped, and `codec` for smaller maps.
+    The file is written next to `filename` and then renamed over it, so an interrupted
+    save never leaves a broken file, and a save being memory-mapped is never overwritten.
+    """
+    if array_codec is None:
+        array_codec = codec
+        for name, payload in sections:
+            if name in ARRAY_SECTIONS and np.size(payload) >= MMAP_MIN_TILES:
+                array_codec = "none"
+    for name in (codec, array_codec):
+        if name not in CODECS:
+            raise ValueError(f"Unknown codec {name!r}, expected one of {CODECS}.")
+
+    temporary_filename = filename + ".tmp"
+    with open(temporary_filename, "wb") as f:
+        f.write(FILE_HEADER.pack(MAGIC, VERSION))
+        for name, payload in sections:
+            if name in PACKED_SECTIONS:
+                section_codec = "none"
+            else:
+                section_codec = array_codec if name in ARRAY_SECTIONS else codec
+            write_section(f, name, payload, section_codec, level)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary_filename, filename)
+
+
+def save(
+    engine: Engine,
+    filename: str,
+    codec: str = DEFAULT_CODEC,
+    level: int = DEFAULT_LEVEL,
+    array_codec: Optional[str] = None,
+) -> None:
+    """Save `engine` to `filename`."""
+    write_snapshot(snapshot(engine), filename, codec, level, array_codec)
+
+
+def save_floor(
+    game_map: GameMap, filename: str, codec: str = DEFAULT_CODEC, level: int = DEFAULT_LEVEL
+) -> None:
+    """Save a floor the player isn't on to `filename`."""
+    sections: List[Tuple[str, Payload]] = [("META", _json_bytes({"map": _map_record(game_map)}))]
+    sections += _map_sections(game_map, detached=False)[1]
+    write_snapshot(sections, filename, codec, level)
+
+
+def _load_array(
+    file: BinaryIO, section: SectionInfo, descr: Any, shape: Tuple[int, int], mmap: bool
+) -> np.ndarray:
+    dtype = np.lib.format.descr_to_dtype(descr)
+    if section.raw_size != dtype.itemsize * shape[0] * shape[1]:
+        raise SaveFormatError("Map array does not match the map size.")
+    if mmap and section.codec == "none" and section.raw_size:
+        if section.offset + section.stored_size > os.fstat(file.fileno()).st_size:
+            raise SaveFormatError("Save file is truncated.")
+        # Copy-on-write: changes made during play stay in memory and never reach the file.
+        return np.memmap(file, dtype=dtype, mode="c", offset=section.offset, shape=shape, order="F")
+    data = read_section(file, section)
+    return np.frombuffer(data, dtype=dtype).reshape(shape, order="F")
+
+
+def _check_sections(directory: Dict[str, SectionInfo], required: Iterable[str]) -> None:
+    missing = set(required) - directory.keys()
+    if missing:
+        raise SaveFormatError(f"Save file is missing sections: {', '.join(sorted(missing))}")
+
+
+def _load_entities(file: BinaryIO, directory: Dict[str, SectionInfo], version: int) -> List[Entity]:
+    if version == 1:
+        records = json.loads(read_section(file, directory["ENTS"]))
+    else:
+        records = read_records(file, directory["ENTS"])
+    return [load_entity(record) for record in records]
+
+
+def _load_message_log_section(file: BinaryIO, directory: Dict[str, SectionInfo], version: int) -> MessageLog:
+    if version == 1:
+        record = json.loads(read_section(file, directory["MLOG"]))
+        return _load_message_log([record, *record.pop("messages")])
+    return _load_message_log(read_records(file, directory["MLOG"]))
+
+
+def _load_map(
+    file: BinaryIO,
+    directory: Dict[str, SectionInfo],
+    map_meta: Dict[str, Any],
+    engine: Engine,
+    entities: List[Entity],
+    mmap: bool,
+) -> GameMap:
+    # Build a GameMap of `entities` from the map sections.
+    if "chunked" in map_meta:
+        game_map: GameMap = _load_chunked_map(file, directory, map_meta, engine, entities)
+    else:
+        _check_sections(directory, ARRAY_SECTIONS)
+        shape = map_meta["width"], map_meta["height"]
+        arrays = {
+            attribute: _load_array(file, directory[name], map_meta["arrays"][name], shape, mmap)
+            for name, attribute in ARRAY_SECTIONS.items()
+        }
+        visible_window = None  # All of `visible`, for saves written before the window was.
+        if "visible_window" in map_meta:
+            x1, y1, x2, y2 = map_meta["visible_window"]
+            visible_window = slice(x1, x2), slice(y1, y2)
+        game_map = GameMap(engine, *shape, entities=entities, visible_window=visible_window, **arrays)
+    for entity in entities:
+        entity.parent = game_map
+    game_map.upstairs_location = tuple(map_meta["upstairs_location"])
+    downstairs_location = map_meta.get("downstairs_location")
+    game_map.downstairs_location = tuple(downstairs_location) if downstairs_location else None
+    game_map.entry_location = tuple(map_meta["entry_location"])
+    return game_map
+
+
+def _load_chunked_map(
+    file: BinaryIO,
+    directory: Dict[str, SectionInfo],
+    map_meta: Dict[str, Any],
+    engine: Engine,
+    entities: List[Entity],
+) -> ChunkedGameMap:
+    # Every chunk starts out evicted, the ones around the player are loaded by set_focus.
+    _check_sections(directory, ["CHNK", "CDAT"])
+    settings = map_meta["chunked"]
+    game_map = ChunkedGameMap(
+        engine,
+        map_meta["width"],
+        map_meta["height"],
+        seed=settings["seed"],
+        entities=entities,
+        max_monsters_per_chunk=settings["max_monsters_per_chunk"],
+        max_items_per_chunk=settings["max_items_per_chunk"],
+        wall_density=settings["wall_density"],
+    )
+    index = read_records(file, directory["CHNK"])
+    data = directory["CDAT"]
+    if data.codec != "none" or data.stored_size != sum(sum(record[2:]) for record in index):
+        raise SaveFormatError("Chunk data does not match the chunk index.")
+    file.seek(data.offset)
+    for cx, cy, tiles_size, explored_size, records_size in index:
+        packed = file.read(tiles_size), file.read(explored_size), file.read(records_size)
+        if sum(len(part) for part in packed) != tiles_size + explored_size + records_size:
+            raise SaveFormatError("Save file is truncated.")
+        game_map.add_packed_chunk((cx, cy), packed)
+    return game_map
+
+
+def load(filename: str, mmap: bool = True) -> Engine:
+    """Load an Engine from a save file written by `save`.
+
+    With `mmap`, uncompressed map arrays are memory-mapped instead of read.
+    """
+    with open(filename, "rb") as f:
+        version, directory = read_directory(f)
+        _check_sections(directory, ["META", "ENTS", "MLOG"])
+        meta = json.loads(read_section(f, directory["META"]))
+        entities = _load_entities(f, directory, version)
+        engine = Engine(player=entities[meta["player"]])
+        engine.message_log = _load_message_log_section(f, directory, version)
+        engine.game_map = _load_map(f, directory, meta["map"], engine, entities, mmap)
+
+    engine.game_world = GameWorld(engine=engine, **meta["world"])
+    engine.game_world.highest_floor = meta.get("highest_floor", engine.game_world.current_floor)
+    engine.game_world.rng.bit_generator.state = meta["rng"]
+    engine.game_map.set_focus(engine.player.x, engine.player.y)  # Loads chunks near the player.
+    return engine
+
+
+def load_floor(engine: Engine, filename: str, mmap: bool = True) -> GameMap:
+    """Load a floor written by `save_floor`."""
+    with open(filename, "rb") as f:
+        version, directory = read_directory(f)
+        _check_sections(directory, ["META", "ENTS"])
+        meta = json.loads(read_section(f, directory["META"]))
+        return _load_map(f, directory, meta["map"], engine, _load_entities(f, directory, version), mmap)
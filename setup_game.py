@@ -1,26 +1,46 @@
 """Handle the loading and initialization of game sessions."""
 from __future__ import annotations
 
-import copy
 from typing import Optional
 
 import lzma
+import os
+import shutil
 import traceback
 import pickle
 import tcod
 
+from autosave import Autosaver
 import color
 from engine import Engine
 import entity_factories
 import input_handlers
 from game_map import GameWorld
+import savefile
 
 
 # Load the background image and remove the alpha channel.
 background_image = tcod.image.load("menu_background.png")[:, :, :3]
 
 
-def new_game() -> Engine:
+# Width and height of the floors of an open world game.
+OPEN_WORLD_SIZE = 1024
+
+
+def new_game(
+    seed: Optional[int] = None,
+    floor_dir: Optional[str] = None,
+    history_path: Optional[str] = None,
+    open_world_size: Optional[int] = None,
+) -> Engine:
+    """Return a brand new game session as an Engine instance.
+
+    Passing the same `seed` generates the same dungeon and the same random events.
+    Floors the player leaves are kept in `floor_dir`, emptied of any previous game's floors.
+    Messages pushed out of the message log are kept in `history_path`, replacing any previous
+    game's history.  With `open_world_size`, floors are open maps of that size, generated in
+    chunks as the player explores, instead of rooms and corridors.
+    """
     map_width = 80
     map_height = 43
 
@@ -31,11 +51,16 @@ def new_game() -> Engine:
     max_monsters_per_room = 2
     max_items_per_room = 1
 
-    player = copy.deepcopy(entity_factories.player)
+    player = entity_factories.player.clone()
 
-    engine = Engine(player=player)
+    if floor_dir:
+        shutil.rmtree(floor_dir, ignore_errors=True)
+    if history_path and os.path.exists(history_path):
+        os.remove(history_path)
 
-    engine.game_world = GameWorld(engine=engine, max_rooms=max_rooms, room_min_size=room_min_size, room_max_size=room_max_size, map_width=map_width, map_height=map_height, max_monsters_per_room=max_monsters_per_room, max_items_per_room=max_items_per_room,)
+    engine = Engine(player=player, message_history_path=history_path)
+
+    engine.game_world = GameWorld(engine=engine, max_rooms=max_rooms, room_min_size=room_min_size, room_max_size=room_max_size, map_width=map_width, map_height=map_height, max_monsters_per_room=max_monsters_per_room, max_items_per_room=max_items_per_room, seed=seed, floor_dir=floor_dir, open_world_size=open_world_size,)
 
     engine.game_world.generate_floor()
     engine.update_fov()
@@ -51,9 +76,13 @@ def new_game() -> Engine:
 
 def load_game(filename: str) -> Engine:
     #Loads an Engine instance from a file.
-    with open(filename, "rb") as f:
-        engine = pickle.loads(lzma.decompress(f.read()))
+    if savefile.is_save_file(filename):
+        engine = savefile.load(filename)
+    else:  # Saved as a pickled Engine, before the save file format.
+        with open(filename, "rb") as f:
+            engine = pickle.loads(lzma.decompress(f.read()))
     assert isinstance(engine, Engine)
+    engine.game_world.prepare_next_floor()
     return engine
 
 class MainMenu(input_handlers.BaseEventHandler):
@@ -80,7 +109,7 @@ class MainMenu(input_handlers.BaseEventHandler):
 
         menu_width = 24
         for i, text in enumerate(
-            ["[N] Play a new game", "[C] Continue last game", "[Q] Quit"]
+            ["[N] Play a new game", "[O] Play a new open world", "[C] Continue last game", "[Q] Quit"]
         ):
             console.print(
                 console.width // 2,
@@ -99,13 +128,21 @@ class MainMenu(input_handlers.BaseEventHandler):
             raise SystemExit()
         elif event.sym == tcod.event.K_c:
             try:
-                return input_handlers.MainGameEventHandler(load_game("savegame.sav"))
+                engine = load_game("savegame.sav")
             except FileNotFoundError:
                 return input_handlers.PopupMessage(self, "No saved game to load.")
             except Exception as exc:
                 traceback.print_exc()  # Print to stderr.
                 return input_handlers.PopupMessage(self, f"Failed to load save:\n{exc}")
-        elif event.sym == tcod.event.K_n:
-            return input_handlers.MainGameEventHandler(new_game())
+            engine.autosaver = Autosaver("savegame.sav")
+            return input_handlers.MainGameEventHandler(engine)
+        elif event.sym in (tcod.event.K_n, tcod.event.K_o):
+            engine = new_game(
+                floor_dir="savegame_floors",
+                history_path="savegame_messages.log",
+                open_world_size=OPEN_WORLD_SIZE if event.sym == tcod.event.K_o else None,
+            )
+            engine.autosaver = Autosaver("savegame.sav")
+            return input_handlers.MainGameEventHandler(engine)
 
         return None
\ No newline at end of file
@@ -0,0 +1,258 @@
+"""Run games without a window, driven by scripted player policies.
+
+Usage: python simulation.py --policy stairs --games 1000 --turns 2000 --workers 8
+
+Add --open-world 1024 to play open worlds of that size instead of dungeons.
+
+Every game is played from its own seed, so any single run can be replayed with
+--games 1 --workers 1 --seed <seed>.
+"""
+from __future__ import annotations
+
+import argparse
+import multiprocessing
+import os
+import random
+import time
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple, Type
+
+import tcod
+
+from actions import Action, BumpAction, ItemAction, PickUpAction, TakeStairsAction, WaitAction
+from components.consumable import HealingConsumable
+from engine import Engine, PATH_RADIUS
+from Entity import Actor, Item
+from game_map import GameMap
+import input_handlers
+import setup_game
+
+DIRECTIONS = [(-1, -1), (0, -1), (1, -1), (-1, 0), (1, 0), (-1, 1), (0, 1), (1, 1)]
+
+
+class PlayerPolicy:
+    """Decides what the player does on each turn of a headless game."""
+
+    def __init__(self, engine: Engine, seed: Optional[int] = None):
+        self.engine = engine
+        self.rng = random.Random(seed)
+
+    @property
+    def player(self) -> Actor:
+        return self.engine.player
+
+    def next_action(self) -> Optional[Action]:
+        """Return the action the player takes this turn."""
+        raise NotImplementedError()
+
+    def level_up(self) -> None:
+        """Pick an attribute when the player levels up.  Defaults to more HP."""
+        self.player.level.increase_max_hp()
+
+    def item_here(self) -> Optional[Item]:
+        for entity in self.engine.game_map.get_entities_at(self.player.x, self.player.y):
+            if isinstance(entity, Item):
+                return entity
+        return None
+
+    def adjacent_enemy(self) -> Optional[Actor]:
+        game_map = self.engine.game_map
+        for dx, dy in DIRECTIONS:
+            target = game_map.get_actor_at(self.player.x + dx, self.player.y + dy)
+            if target:
+                return target
+        return None
+
+
+class RandomWalkPolicy(PlayerPolicy):
+    """Stumble around, attacking anything in the way and grabbing whatever is underfoot."""
+
+    def next_action(self) -> Optional[Action]:
+        if (self.player.x, self.player.y) == self.engine.game_map.upstairs_location:
+            return TakeStairsAction(self.player)
+        if self.item_here() and len(self.player.inventory.items) < self.player.inventory.capacity:
+            return PickUpAction(self.player)
+        dx, dy = self.rng.choice(DIRECTIONS)
+        return BumpAction(self.player, dx, dy)
+
+
+class StairsRushPolicy(PlayerPolicy):
+    """Head straight for the stairs, fighting adjacent enemies and healing when low."""
+
+    def __init__(self, engine: Engine, seed: Optional[int] = None):
+        super().__init__(engine, seed)
+        self.heal_below = 0.5
+
+    def next_action(self) -> Optional[Action]:
+        player = self.player
+        fighter = player.fighter
+
+        if fighter.hp < fighter.max_hp * self.heal_below:
+            for item in player.inventory.items:
+                if isinstance(item.consumable, HealingConsumable):
+                    return ItemAction(player, item)
+
+        target = self.adjacent_enemy()
+        if target:
+            return BumpAction(player, target.x - player.x, target.y - player.y)
+
+        if (player.x, player.y) == self.engine.game_map.upstairs_location:
+            return TakeStairsAction(player)
+
+        if self.item_here() and len(player.inventory.items) < player.inventory.capacity:
+            return PickUpAction(player)
+
+        step = self.step_toward_stairs()
+        if step:
+            return BumpAction(player, step[0] - player.x, step[1] - player.y)
+        return WaitAction(player)
+
+    def step_toward_stairs(self) -> Optional[Tuple[int, int]]:
+        game_map = self.engine.game_map
+        player = self.player
+        if game_map.is_large:
+            # Only search around the player, toward the point of the area nearest the stairs.
+            window = game_map.radius_window(player.x, player.y, PATH_RADIUS)
+        else:
+            window = game_map.clip_window(0, 0, game_map.width, game_map.height)
+        xs, ys = window
+        stairs_x, stairs_y = game_map.upstairs_location
+        goal = min(max(stairs_x, xs.start), xs.stop - 1), min(max(stairs_y, ys.start), ys.stop - 1)
+        graph = tcod.path.SimpleGraph(cost=game_map.get_path_cost(window), cardinal=2, diagonal=3)
+        pathfinder = tcod.path.Pathfinder(graph)
+        pathfinder.add_root((goal[0] - xs.start, goal[1] - ys.start))
+        path: List[List[int]] = pathfinder.path_from((player.x - xs.start, player.y - ys.start))[1:2].tolist()
+        if not path:
+            if game_map.is_large:  # Blocked off from the goal, wander until it can be reached.
+                dx, dy = self.rng.choice(DIRECTIONS)
+                return player.x + dx, player.y + dy
+            return None
+        return path[0][0] + xs.start, path[0][1] + ys.start
+
+
+POLICIES: Dict[str, Type[PlayerPolicy]] = {
+    "random": RandomWalkPolicy,
+    "stairs": StairsRushPolicy,
+}
+
+
+class SimulationResult(NamedTuple):
+    seed: int
+    floor: int
+    turns: int
+    kills: int
+    died: bool
+    seconds: float
+
+    @property
+    def turns_per_second(self) -> float:
+        return self.turns / self.seconds if self.seconds else 0.0
+
+
+def count_kills(game_map: GameMap, player: Actor) -> int:
+    # Corpses stay on their floor, so every dead actor besides the player is a kill.
+    return sum(
+        1
+        for entity in game_map.entities
+        if isinstance(entity, Actor) and not entity.is_alive and entity is not player
+    )
+
+
+def run_game(
+    policy_cls: Type[PlayerPolicy], max_turns: int = 1000, seed: int = 0, open_world_size: Optional[int] = None
+) -> SimulationResult:
+    """Play one game without rendering until the player dies or `max_turns` is reached."""
+    engine = setup_game.new_game(seed=seed, open_world_size=open_world_size)
+    handler = input_handlers.EventHandler(engine)
+    policy = policy_cls(engine, seed)
+
+    turns = 0
+    kills = 0
+    game_map = engine.game_map
+    start = time.perf_counter()
+    while turns < max_turns and engine.player.is_alive:
+        if engine.player.level.requires_level_up:
+            policy.level_up()
+        if handler.handle_action(policy.next_action()):
+            turns += 1
+        if engine.game_map is not game_map:  # Took the stairs.
+            kills += count_kills(game_map, engine.player)
+            game_map = engine.game_map
+    seconds = time.perf_counter() - start
+    kills += count_kills(game_map, engine.player)
+
+    return SimulationResult(
+        seed=seed,
+        floor=engine.game_world.current_floor,
+        turns=turns,
+        kills=kills,
+        died=not engine.player.is_alive,
+        seconds=seconds,
+    )
+
+
+def _run_job(job: Tuple[str, int, int, Optional[int]]) -> SimulationResult:
+    policy_name, max_turns, seed, open_world_size = job
+    return run_game(POLICIES[policy_name], max_turns=max_turns, seed=seed, open_world_size=open_world_size)
+
+
+def run_batch(
+    policy_name: str,
+    games: int,
+    max_turns: int,
+    base_seed: int,
+    workers: int = 1,
+    open_world_size: Optional[int] = None,
+) -> Iterator[SimulationResult]:
+    """Play `games` independent games across `workers` processes.
+
+    Game `i` is seeded with `base_seed + i`.  Results are yielded as each game finishes,
+    which is not necessarily in seed order.
+    """
+    jobs = [(policy_name, max_turns, base_seed + i, open_world_size) for i in range(games)]
+    if workers <= 1:
+        yield from map(_run_job, jobs)
+        return
+    with multiprocessing.Pool(workers) as pool:
+        yield from pool.imap_unordered(_run_job, jobs)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run headless playthroughs.")
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="stairs")
+    parser.add_argument("--games", type=int, default=1)
+    parser.add_argument("--turns", type=int, default=1000, help="Turn limit per game.")
+    parser.add_argument("--seed", type=int, default=None, help="Seed of the first game.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument(
+        "--open-world", type=int, default=None, metavar="SIZE", help="Play open worlds of this size."
+    )
+    args = parser.parse_args()
+
+    base_seed = args.seed if args.seed is not None else random.randrange(2 ** 31)
+    print(f"policy {args.policy}, base seed {base_seed}, {args.workers} workers")
+
+    total_turns = 0
+    total_kills = 0
+    deaths = 0
+    results = 0
+    start = time.perf_counter()
+    for result in run_batch(args.policy, args.games, args.turns, base_seed, args.workers, args.open_world):
+        results += 1
+        total_turns += result.turns
+        total_kills += result.kills
+        deaths += result.died
+        print(
+            f"seed {result.seed}: floor {result.floor}, {result.turns} turns, {result.kills} kills, "
+            f"{'died' if result.died else 'survived'}, {result.turns_per_second:.0f} turns/s"
+        )
+    seconds = time.perf_counter() - start
+
+    if results and seconds:
+        print(
+            f"{results} games, {deaths} deaths, {total_kills} kills, "
+            f"{total_turns} turns in {seconds:.2f}s: {total_turns / seconds:.0f} turns/s"
+        )
+
+
+if __name__ == "__main__":
+    main()
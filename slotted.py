@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+from typing import Any, Dict
+
+
+class Slotted:
+    """Base class for classes which declare `__slots__` instead of using a `__dict__`.
+
+    Pickles as a plain dict of the slots which are set.  Objects saved before their class
+    used `__slots__` had the same dict as their state, so older saves still load.
+    """
+
+    __slots__ = ()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = {}
+        for cls in type(self).__mro__:
+            for name in cls.__dict__.get("__slots__", ()):
+                if hasattr(self, name):
+                    state[name] = getattr(self, name)
+        return state
+
+    def __setstate__(self, state: Any) -> None:
+        if isinstance(state, tuple):  # (__dict__ state, slot state) from default pickling.
+            dict_state, slot_state = state
+            state = {**(dict_state or {}), **(slot_state or {})}
+        for name, value in state.items():
+            setattr(self, name, value)
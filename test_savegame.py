@@ -0,0 +1,239 @@
+"""Loading real save files through setup_game.load_game.
+
+Run with: python -m unittest test_savegame
+"""
+from __future__ import annotations
+
+import json
+import lzma
+import os
+import pickle
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import tcod
+
+from autosave import Autosaver
+from engine import Engine
+import entity_factories
+from game_map import GameMap, LARGE_MAP_TILES
+import savefile
+import setup_game
+import tile_types
+from exceptions import SaveFormatError
+
+
+class LoadGameTest(unittest.TestCase):
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def check_playable(self, engine: Engine) -> None:
+        # A loaded game has its map indexes rebuilt and can take a turn and draw a frame.
+        player = engine.player
+        game_map = engine.game_map
+        self.assertIs(player.gamemap, game_map)
+        self.assertIn(player, game_map.get_entities_at(player.x, player.y))
+        for entity in game_map.entities:
+            self.assertIn(entity, game_map.get_entities_at(entity.x, entity.y))
+        engine.handle_enemy_turns()
+        engine.update_fov()
+        engine.render(tcod.Console(80, 50, order="F"))
+
+    def test_load_pickled_save(self) -> None:
+        # The format the game wrote before savefile.py: an lzma compressed pickle of the Engine.
+        engine = setup_game.new_game(seed=1)
+        filename = os.path.join(self.directory, "pickled.sav")
+        with open(filename, "wb") as f:
+            f.write(lzma.compress(pickle.dumps(engine)))
+
+        loaded = setup_game.load_game(filename)
+        self.assertEqual((loaded.player.x, loaded.player.y), (engine.player.x, engine.player.y))
+        self.assertEqual(len(loaded.game_map.entities), len(engine.game_map.entities))
+        self.check_playable(loaded)
+
+    def test_load_save_file(self) -> None:
+        engine = setup_game.new_game(seed=2)
+        filename = os.path.join(self.directory, "game.sav")
+        engine.save_as(filename)
+
+        loaded = setup_game.load_game(filename)
+        self.assertEqual((loaded.player.x, loaded.player.y), (engine.player.x, engine.player.y))
+        self.assertEqual(len(loaded.game_map.entities), len(engine.game_map.entities))
+        self.assertEqual(
+            [message.plain_text for message in loaded.message_log.messages],
+            [message.plain_text for message in engine.message_log.messages],
+        )
+        self.check_playable(loaded)
+
+    def test_load_version_1(self) -> None:
+        # Version 1 stored the entities as one JSON list and the message log as one object.
+        engine = setup_game.new_game(seed=5)
+        sections = dict(savefile.snapshot(engine, detached=True))
+        entities = [json.loads(line) for line in b"".join(sections["ENTS"]).splitlines()]
+        log_lines = [json.loads(line) for line in b"".join(sections["MLOG"]).splitlines()]
+        sections["ENTS"] = savefile._json_bytes(entities)
+        sections["MLOG"] = savefile._json_bytes({**log_lines[0], "messages": log_lines[1:]})
+        filename = os.path.join(self.directory, "version1.sav")
+        with open(filename, "wb") as f:
+            f.write(savefile.FILE_HEADER.pack(savefile.MAGIC, 1))
+            for name, payload in sections.items():
+                savefile.write_section(f, name, payload, "zlib", 6)
+
+        loaded = setup_game.load_game(filename)
+        self.assertEqual(len(loaded.game_map.entities), len(engine.game_map.entities))
+        self.assertEqual(
+            [message.plain_text for message in loaded.message_log.messages],
+            [message.plain_text for message in engine.message_log.messages],
+        )
+        self.check_playable(loaded)
+
+        with open(filename, "r+b") as f:
+            f.write(savefile.FILE_HEADER.pack(savefile.MAGIC, 0))
+        with self.assertRaises(SaveFormatError):
+            savefile.load(filename)
+
+    def test_load_large_map(self) -> None:
+        # Large maps are memory-mapped on load and only read around the player.
+        engine = setup_game.new_game(seed=4)
+        size = int(LARGE_MAP_TILES ** 0.5)
+        game_map = GameMap(engine, size, size)
+        game_map.tiles[1:-1, 1:-1] = tile_types.floor
+        game_map.mark_tiles_changed()
+        engine.game_map = game_map
+        engine.player.place(size // 2, size // 2, game_map)
+        entity_factories.bot.spawn(game_map, size // 2 + 3, size // 2)
+        engine.update_fov()
+        filename = os.path.join(self.directory, "large.sav")
+        engine.save_as(filename)
+
+        loaded = setup_game.load_game(filename)
+        loaded_map = loaded.game_map
+        self.assertIsInstance(loaded_map.tiles, np.memmap)
+        self.assertIsNone(loaded_map._graphics)
+        self.assertEqual(loaded_map.visible_window, game_map.visible_window)
+        window = loaded_map.radius_window(size // 2, size // 2, 5)
+        expected = np.array(game_map.tiles["walkable"][window], dtype=np.int8)
+        expected[[5, 8], [5, 5]] += 10  # The player and the bot block.
+        np.testing.assert_array_equal(loaded_map.get_path_cost(window), expected)
+        self.check_playable(loaded)
+
+    def test_load_open_world(self) -> None:
+        # Chunks evicted to the spill file are saved along with the loaded ones.
+        engine = setup_game.new_game(seed=5, open_world_size=512)
+        game_map = engine.game_map
+        x, y = engine.player.x, engine.player.y
+        window = game_map.radius_window(x, y, 20)
+        tiles = game_map.get_tiles(window).copy()
+        engine.player.place(10, 10)
+        engine.update_fov()  # Evicts the chunks around the starting point.
+        engine.player.place(x, y)
+        engine.update_fov()
+        engine.player.place(500, 500)
+        engine.update_fov()
+        self.assertGreater(game_map.chunk_stats["evicted"], 0)
+        filename = os.path.join(self.directory, "open.sav")
+        engine.save_as(filename)
+
+        loaded = setup_game.load_game(filename)
+        loaded_map = loaded.game_map
+        self.assertEqual(type(loaded_map), type(game_map))
+        self.assertEqual((loaded.player.x, loaded.player.y), (500, 500))
+        stats, loaded_stats = game_map.chunk_stats, loaded_map.chunk_stats
+        self.assertEqual(
+            stats["loaded"] + stats["evicted"], loaded_stats["loaded"] + loaded_stats["evicted"]
+        )
+        self.assertEqual(loaded_stats["generated"], 0)
+        self.check_playable(loaded)
+        loaded.player.place(x, y)
+        loaded.update_fov()
+        np.testing.assert_array_equal(loaded_map.get_tiles(window), tiles)
+
+    def test_message_history_kept(self) -> None:
+        history_path = os.path.join(self.directory, "messages.log")
+        engine = setup_game.new_game(seed=3, history_path=history_path)
+        engine.message_log.capacity = 4
+        for i in range(10):
+            engine.message_log.add_message(f"Message {i}")
+        expected = [message.plain_text for message in engine.message_log.get_messages(0, 12)]
+        filename = os.path.join(self.directory, "game.sav")
+        engine.save_as(filename)
+        engine.message_log.close()
+
+        loaded = setup_game.load_game(filename)
+        self.addCleanup(loaded.message_log.close)
+        self.assertEqual(loaded.message_log.history_path, history_path)
+        self.assertEqual(loaded.message_log.oldest_index, 0)
+        self.assertEqual(
+            [message.plain_text for message in loaded.message_log.get_messages(0, 12)], expected
+        )
+        loaded.message_log.add_message("After loading")
+        self.assertEqual(loaded.message_log.get_messages(0, 1)[0].plain_text, expected[0])
+
+    def test_load_baseline_savegame(self) -> None:
+        # savegame.sav was pickled before entities, components and messages used __slots__.
+        filename = os.path.join(os.path.dirname(os.path.abspath(__file__)), "savegame.sav")
+        loaded = setup_game.load_game(filename)
+        player = loaded.player
+        self.assertIs(player.fighter.parent, player)
+        self.assertIs(player.inventory.parent, player)
+        self.assertIs(player.level.parent, player)
+        for item in player.inventory.items:
+            self.assertIs(item.consumable.parent, item)
+        self.assertTrue(loaded.message_log.messages)
+        self.check_playable(loaded)
+
+
+class FloorCacheTest(unittest.TestCase):
+    def test_evicted_floor_kept(self) -> None:
+        # Without a floor_dir, an evicted floor is written to a temporary directory.
+        engine = setup_game.new_game(seed=6)
+        world = engine.game_world
+        world.max_cached_floors = 2
+        first_map = engine.game_map
+        enemy = next(iter(first_map.actors))
+        first_map.remove_entity(enemy)
+        remaining = len(first_map.entities) - 1  # Without the player.
+        for floor in (2, 3):
+            world.change_floor(floor)
+        self.assertNotIn(1, world.cache_stats["floors"])
+        self.assertTrue(os.path.exists(world.floor_path(1)))
+
+        world.change_floor(1)
+        self.assertEqual(world.cache_stats["misses"], 1)
+        self.assertEqual(len(engine.game_map.entities) - 1, remaining)
+        np.testing.assert_array_equal(engine.game_map.tiles, first_map.tiles)
+
+    def test_pickled_floors_kept(self) -> None:
+        engine = setup_game.new_game(seed=6)
+        engine.game_world.change_floor(2)
+        loaded = pickle.loads(pickle.dumps(engine))
+        self.assertEqual(loaded.game_world.cache_stats["floors"], [1, 2])
+        first_map = loaded.game_world.get_floor(1)
+        for entity in first_map.entities:
+            self.assertIn(entity, first_map.get_entities_at(entity.x, entity.y))
+
+
+class AutosaverTest(unittest.TestCase):
+    def test_snapshot_failure_is_counted(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            autosaver = Autosaver(os.path.join(directory, "auto.sav"))
+            self.addCleanup(autosaver.close)
+            engine = setup_game.new_game(seed=6)
+            with mock.patch("savefile.snapshot", side_effect=SaveFormatError("Can't save.")):
+                with mock.patch("traceback.print_exc"):
+                    autosaver.save(engine)
+            self.assertEqual(autosaver.failed, 1)
+            self.assertEqual(autosaver.saves_started, 0)
+
+            autosaver.save(engine)
+            autosaver.flush()
+            self.assertEqual(autosaver.saves_written, 1)
+            self.assertTrue(os.path.exists(autosaver.filename))
+
+
+if __name__ == "__main__":
+    unittest.main()
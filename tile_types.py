@@ -36,3 +36,4 @@ SHROUD = np.array((ord(" "), (255, 255, 255), (0, 0, 0)), dtype=graphic_dt)
 floor = new_tile(walkable=True, transparent=True, dark=(ord(" "), (255, 255, 255), (50, 50, 150)), light=(ord(" "), (255, 255, 255), (200, 180, 50)))
 wall = new_tile(walkable=False, transparent=False, dark=(ord(" "), (255, 255, 255), (0, 0, 100)), light=(ord(" "), (255, 255, 255), (130, 110, 50)))
 up_stairs = new_tile(walkable=True, transparent=True, dark=(ord(">"), (0, 0, 100), (50, 50, 150)), light=(ord(">"), (255, 255, 255), (200, 180, 50)))
+down_stairs = new_tile(walkable=True, transparent=True, dark=(ord("<"), (0, 0, 100), (50, 50, 150)), light=(ord("<"), (255, 255, 255), (200, 180, 50)))
@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import heapq
+from typing import Dict, Iterator, List, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from Entity import Actor
+
+# Time an action takes.  Every actor acts once per turn until speeds are added.
+ACTION_TIME = 1
+
+
+class TurnScheduler:
+    """The living AI actors on a GameMap, in the order they act.
+
+    A heap of (time, seq, actor) entries, where `time` is when the actor acts next and `seq`
+    (the order actors were added in) breaks ties, so turn order is reproducible.  The GameMap
+    adds and removes actors as they spawn, die or leave it.  Removed actors are only marked
+    as such, their entries are dropped when they reach the top of the heap.
+
+    Suspended actors keep their seq, so when resumed they act in their old place in the order.
+    """
+
+    def __init__(self) -> None:
+        self.time = 0  # The next turn to be taken.
+        self._heap: List[Tuple[int, int, Actor]] = []
+        # The (time, seq) of each scheduled actor's live entry, other entries are stale.
+        self._entries: Dict[Actor, Tuple[int, int]] = {}
+        self._suspended: Dict[Actor, int] = {}  # The seq of each suspended actor.
+        self._next_seq = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, actor: Actor) -> bool:
+        return actor in self._entries
+
+    def _push(self, time: int, seq: int, actor: Actor) -> None:
+        self._entries[actor] = time, seq
+        heapq.heappush(self._heap, (time, seq, actor))
+
+    def add(self, actor: Actor, delay: int = 0) -> None:
+        """Schedule an actor to act `delay` after the next turn."""
+        if actor in self._entries or actor in self._suspended:
+            return
+        seq = self._next_seq
+        self._next_seq += 1
+        self._push(self.time + delay, seq, actor)
+
+    def remove(self, actor: Actor) -> None:
+        """Stop scheduling an actor, does nothing if it isn't scheduled."""
+        self._entries.pop(actor, None)
+        self._suspended.pop(actor, None)
+        self._compact()
+
+    def suspend(self, actor: Actor) -> None:
+        """Stop scheduling an actor until it is resumed."""
+        entry = self._entries.pop(actor, None)
+        if entry is not None:
+            self._suspended[actor] = entry[1]
+            self._compact()
+
+    def resume(self, actor: Actor) -> None:
+        """Schedule a suspended actor to act from the next turn."""
+        seq = self._suspended.pop(actor, None)
+        if seq is not None:
+            self._push(self.time, seq, actor)
+
+    def _compact(self) -> None:
+        if len(self._heap) > 2 * len(self._entries) + 16:
+            # Mostly stale entries, drop them all at once.
+            entries = self._entries
+            self._heap = [entry for entry in self._heap if entries.get(entry[2]) == entry[:2]]
+            heapq.heapify(self._heap)
+
+    def take_turn(self) -> Iterator[Actor]:
+        """Yield each actor due to act in the current turn, then move on to the next turn.
+
+        Each actor is scheduled again one ACTION_TIME later as it is yielded.  Actors removed
+        during the turn are skipped, actors added during it act from the next turn.
+        """
+        now = self.time
+        self.time += 1
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            time, seq, actor = heapq.heappop(heap)
+            if self._entries.get(actor) != (time, seq):
+                continue  # Removed, suspended or rescheduled.
+            self._push(time + ACTION_TIME, seq, actor)
+            yield actor